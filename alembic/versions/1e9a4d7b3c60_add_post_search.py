@@ -0,0 +1,72 @@
+"""add post search
+
+Revision ID: 1e9a4d7b3c60
+Revises: f17b0c6d2e85
+Create Date: 2026-10-18 14:05:18.447120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1e9a4d7b3c60'
+down_revision: Union[str, Sequence[str], None] = 'f17b0c6d2e85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Rows indexed per statement; keeps each backfill step short on large tables
+BATCH_SIZE = 5000
+
+# Must match search.TSVECTOR_EXPRESSION; copied so this revision keeps working if that changes
+TSVECTOR_EXPRESSION = (
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', content), 'B')"
+)
+
+
+def id_batches():
+    """Yield (after_id, last_id] ranges of post ids holding BATCH_SIZE rows each."""
+    bind = op.get_bind()
+    after_id = 0
+    while True:
+        last_id = bind.execute(
+            sa.text("SELECT max(id) FROM (SELECT id FROM posts WHERE id > :after_id ORDER BY id LIMIT :batch_size) AS batch"),
+            {"after_id": after_id, "batch_size": BATCH_SIZE},
+        ).scalar()
+        if last_id is None:
+            return
+        yield after_id, last_id
+        after_id = last_id
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        backfill = f"UPDATE posts SET search_vector = {TSVECTOR_EXPRESSION} WHERE id > :after_id AND id <= :last_id"
+    else:
+        op.execute("CREATE VIRTUAL TABLE posts_fts USING fts5(title, content)")
+        backfill = (
+            "INSERT INTO posts_fts (rowid, title, content) "
+            "SELECT id, title, content FROM posts WHERE id > :after_id AND id <= :last_id"
+        )
+
+    for after_id, last_id in id_batches():
+        bind.execute(sa.text(backfill), {"after_id": after_id, "last_id": last_id})
+
+    if bind.dialect.name == 'postgresql':
+        # building the GIN index once after the backfill is much cheaper than maintaining it row by row
+        op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_posts_search_vector', table_name='posts', postgresql_using='gin')
+        op.drop_column('posts', 'search_vector')
+    else:
+        op.execute("DROP TABLE posts_fts")
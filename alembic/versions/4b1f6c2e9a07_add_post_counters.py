@@ -0,0 +1,41 @@
+"""add post counters
+
+Revision ID: 4b1f6c2e9a07
+Revises: dcc2a414f568
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b1f6c2e9a07'
+down_revision: Union[str, Sequence[str], None] = 'dcc2a414f568'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('counters',
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('value', sa.Integer(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    op.add_column('users', sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill from the existing rows so the counters start out exact
+    op.execute("INSERT INTO counters (name, value) SELECT 'posts', COUNT(*) FROM posts")
+    op.execute(
+        "UPDATE users SET post_count = "
+        "(SELECT COUNT(*) FROM posts WHERE posts.user_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('users', 'post_count')
+    op.drop_table('counters')
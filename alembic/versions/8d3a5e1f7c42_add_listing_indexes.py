@@ -0,0 +1,35 @@
+"""add listing indexes
+
+Revision ID: 8d3a5e1f7c42
+Revises: 4b1f6c2e9a07
+Create Date: 2026-10-18 10:03:51.602377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d3a5e1f7c42'
+down_revision: Union[str, Sequence[str], None] = '4b1f6c2e9a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_posts_date_posted_id', 'posts', [sa.text('date_posted DESC'), sa.text('id DESC')], unique=False)
+    op.create_index('ix_posts_user_id_date_posted_id', 'posts', ['user_id', sa.text('date_posted DESC'), sa.text('id DESC')], unique=False)
+    # (user_id, date_posted, id) has user_id as its leading column, so this one is redundant now
+    op.drop_index(op.f('ix_posts_user_id'), table_name='posts')
+    op.create_index(op.f('ix_password_reset_tokens_user_id'), 'password_reset_tokens', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_password_reset_tokens_user_id'), table_name='password_reset_tokens')
+    op.create_index(op.f('ix_posts_user_id'), 'posts', ['user_id'], unique=False)
+    op.drop_index('ix_posts_user_id_date_posted_id', table_name='posts')
+    op.drop_index('ix_posts_date_posted_id', table_name='posts')
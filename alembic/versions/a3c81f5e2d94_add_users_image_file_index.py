@@ -0,0 +1,29 @@
+"""add users image_file index
+
+Revision ID: a3c81f5e2d94
+Revises: 1e9a4d7b3c60
+Create Date: 2026-10-18 13:12:27.418305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c81f5e2d94'
+down_revision: Union[str, Sequence[str], None] = '1e9a4d7b3c60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # profile pictures are shared by content hash; deleting one checks no other user still uses it
+    op.create_index(op.f('ix_users_image_file'), 'users', ['image_file'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_users_image_file'), table_name='users')
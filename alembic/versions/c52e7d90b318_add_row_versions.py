@@ -0,0 +1,44 @@
+"""add row versions
+
+Revision ID: c52e7d90b318
+Revises: 8d3a5e1f7c42
+Create Date: 2026-10-18 11:27:06.934155
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52e7d90b318'
+down_revision: Union[str, Sequence[str], None] = '8d3a5e1f7c42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # SQLite cannot add a column with a non-constant default, so add them nullable and backfill
+    op.add_column('posts', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('users', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('users', sa.Column('posts_version', sa.Integer(), server_default='0', nullable=False))
+
+    op.execute("UPDATE posts SET updated_at = date_posted")
+    op.execute("UPDATE users SET updated_at = CURRENT_TIMESTAMP")
+    op.execute("INSERT INTO counters (name, value) VALUES ('posts_version', 0)")
+
+    # batch mode rebuilds the tables on SQLite, which cannot alter a column in place
+    with op.batch_alter_table('posts') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+    with op.batch_alter_table('users') as batch_op:
+        batch_op.alter_column('updated_at', existing_type=sa.DateTime(timezone=True), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM counters WHERE name = 'posts_version'")
+    op.drop_column('users', 'posts_version')
+    op.drop_column('users', 'updated_at')
+    op.drop_column('posts', 'updated_at')
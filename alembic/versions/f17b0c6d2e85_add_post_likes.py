@@ -0,0 +1,37 @@
+"""add post likes
+
+Revision ID: f17b0c6d2e85
+Revises: c52e7d90b318
+Create Date: 2026-10-18 12:40:33.271904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f17b0c6d2e85'
+down_revision: Union[str, Sequence[str], None] = 'c52e7d90b318'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('post_likes',
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('post_id', 'user_id')
+    )
+    op.create_index(op.f('ix_post_likes_user_id'), 'post_likes', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_post_likes_user_id'), table_name='post_likes')
+    op.drop_table('post_likes')
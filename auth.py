@@ -1,16 +1,19 @@
+from dataclasses import dataclass
 from datetime import UTC, datetime, timedelta
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from pwdlib import PasswordHash
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
+from cache import TTLCache
 from config import settings
 from database import get_db
+from executors import BoundedExecutor, ExecutorBusy
 
 import hashlib
 import secrets
@@ -20,6 +23,10 @@ import secrets
 
 password_hash = PasswordHash.recommended()
 
+# uvicorn rewrites the client address from X-Forwarded-For only for trusted proxies, so a
+# reverse proxy on the same host does not make every client look local
+LOOPBACK_HOSTS = {"127.0.0.1", "::1"}
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/users/token")
 
 
@@ -31,6 +38,35 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return password_hash.verify(plain_password, hashed_password)
 
 
+# Argon2 takes tens of milliseconds of CPU per call (the C implementation releases the GIL),
+# so handlers hash on this pool rather than blocking the event loop
+password_hash_executor = BoundedExecutor(
+    "password_hash",
+    max_workers=settings.password_hash_workers,
+    max_queue=settings.password_hash_max_queue,
+    queue_timeout=settings.password_hash_queue_timeout_seconds,
+)
+
+
+async def _run_password_hasher(fn, *args):
+    try:
+        return await password_hash_executor.run(fn, *args)
+    except ExecutorBusy as err:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        ) from err
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_password_hasher(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_password_hasher(verify_password, plain_password, hashed_password)
+
+
 def generate_reset_token() -> str:
     return secrets.token_urlsafe(32)
 
@@ -71,10 +107,42 @@ def verify_access_token(token: str) -> str | None:
         return payload.get("sub")
 
 
+@dataclass(frozen=True, slots=True)
+class AuthUser:
+    """The fields of the authenticated user that requests need, cached between requests."""
+
+    id: int
+    username: str
+    email: str
+    image_file: str | None
+
+    @property
+    def image_path(self) -> str:
+        return models.profile_image_path(self.image_file)
+
+    @property
+    def image_srcset(self) -> dict[str, str]:
+        return models.profile_image_srcset(self.image_file)
+
+    @classmethod
+    def from_model(cls, user: models.User) -> "AuthUser":
+        return cls(id=user.id, username=user.username, email=user.email, image_file=user.image_file)
+
+
+# Saves the user lookup on every authenticated request. Entries are dropped on every change to
+# the user; other workers pick the change up within the TTL, so handlers that write rows
+# referencing the user take VerifiedUser, which checks the user still exists.
+user_cache = TTLCache(maxsize=settings.user_cache_max_entries, ttl=settings.user_cache_ttl_seconds)
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    user_cache.invalidate(user_id)
+
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_scheme)],
     db: Annotated[AsyncSession, Depends(get_db)],
-) -> models.User:
+) -> AuthUser:
     user_id = verify_access_token(token)
     if user_id is None:
         raise HTTPException(
@@ -92,6 +160,10 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    cached = user_cache.get(user_id_int)
+    if cached is not None:
+        return cached
+
     result = await db.execute(
         select(models.User).where(models.User.id == user_id_int),
     )
@@ -102,7 +174,69 @@ async def get_current_user(
             detail="User not found",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    auth_user = AuthUser.from_model(user)
+    user_cache.set(user_id_int, auth_user)
+    return auth_user
+
+
+CurrentUser = Annotated[AuthUser, Depends(get_current_user)]
+
+
+async def get_verified_user(
+    current_user: CurrentUser,
+    db: Annotated[AsyncSession, Depends(get_db)],
+) -> AuthUser:
+    """The authenticated user, checked against the database, for handlers that write rows referencing them.
+
+    The user cache is per process: a deletion served by another worker reaches this one only
+    when the entry expires, and SQLite does not enforce foreign keys to catch it meanwhile.
+    """
+    result = await db.execute(select(models.User.id).where(models.User.id == current_user.id))
+    if result.first() is None:
+        invalidate_cached_user(current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return current_user
+
+
+VerifiedUser = Annotated[AuthUser, Depends(get_verified_user)]
+
+
+async def get_current_user_record(
+    current_user: CurrentUser,
+    db: Annotated[AsyncSession, Depends(get_db)],
+) -> models.User:
+    """Load the full ORM row of the authenticated user, for handlers that change it."""
+    result = await db.execute(
+        select(models.User).where(models.User.id == current_user.id),
+    )
+    user = result.scalars().first()
+    if not user:
+        invalidate_cached_user(current_user.id)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="User not found",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
     return user
 
 
-CurrentUser = Annotated[models.User, Depends(get_current_user)]
\ No newline at end of file
+CurrentUserRecord = Annotated[models.User, Depends(get_current_user_record)]
+
+
+def require_internal_access(request: Request) -> None:
+    """Admit operators only: the internal_api_token as a bearer token, or loopback clients if none is set."""
+    expected = settings.internal_api_token.get_secret_value()
+    if expected:
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and secrets.compare_digest(token.encode(), expected.encode()):
+            return
+    elif request.client is not None and request.client.host in LOOPBACK_HOSTS:
+        return
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Not authorized",
+    )
@@ -0,0 +1,127 @@
+"""Compare profile-picture processing before and after reduced-size decoding.
+
+Usage (from the project root):
+
+    python -m benchmarks.images                    # generates a corpus of large photos
+    python -m benchmarks.images --corpus ~/photos  # or uses your own images
+
+Every image is processed by each implementation in a fresh child process, so peak RSS is
+measured per image rather than accumulated over the run.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+from images_utils import process_profile_image
+
+# (width, height, format): phone-camera and screenshot sized originals
+CORPUS = [
+    (8160, 6120, "JPEG"),
+    (6000, 4000, "JPEG"),
+    (4032, 3024, "JPEG"),
+    (4000, 3000, "PNG"),
+    (3024, 4032, "WEBP"),
+]
+
+
+def legacy_process_profile_image(source: str | Path) -> str:
+    # process_profile_image as it was before draft/reduce: full decode, then one LANCZOS pass
+    with Image.open(source) as original:
+        img = ImageOps.exif_transpose(original)
+        img = ImageOps.fit(img, (300, 300), method=Image.Resampling.LANCZOS)
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGB")
+        filename = f"{uuid.uuid4().hex}.jpg"
+        img.save(filename, "JPEG", quality=85, optimize=True)
+    return filename
+
+
+IMPLEMENTATIONS = {
+    "legacy": legacy_process_profile_image,
+    "current": lambda path: process_profile_image(path, sys.maxsize),
+}
+
+
+def make_corpus(directory: Path) -> None:
+    for width, height, fmt in CORPUS:
+        # a gradient with noise compresses roughly like a photo, unlike a flat colour
+        noise = Image.effect_noise((width // 8, height // 8), 64).resize((width, height))
+        gradient = Image.linear_gradient("L").resize((width, height))
+        img = Image.merge("RGB", (noise, gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+        path = directory / f"{width}x{height}.{fmt.lower()}"
+        img.save(path, fmt, quality=90)
+
+
+def run_worker(name: str, path: Path, repeat: int) -> None:
+    process = IMPLEMENTATIONS[name]
+    samples = []
+    with tempfile.TemporaryDirectory() as out:
+        out_dir = Path(out)
+        os.chdir(out_dir)
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process(path)
+            samples.append(time.perf_counter() - start)
+            # otherwise the next run would find the content-hashed files already there
+            shutil.rmtree(out_dir / "media", ignore_errors=True)
+    # ru_maxrss is in KiB on Linux
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(json.dumps({"seconds": min(samples), "peak_rss_mb": peak_rss_mb}))
+
+
+def run_child(name: str, path: Path, repeat: int) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.images", "--worker", name, "--repeat", str(repeat), str(path)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output)
+
+
+def main(args: argparse.Namespace) -> None:
+    if args.make_corpus:
+        make_corpus(Path(args.make_corpus))
+        return
+    if args.worker:
+        run_worker(args.worker, Path(args.path).resolve(), args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.corpus:
+            paths = sorted(path.resolve() for path in Path(args.corpus).iterdir() if path.is_file())
+        else:
+            # generated in a child: Linux carries ru_maxrss across exec, so a large parent
+            # would inflate every measurement below
+            print("Generating corpus...", file=sys.stderr)
+            subprocess.run([sys.executable, "-m", "benchmarks.images", "--make-corpus", scratch], check=True)
+            paths = sorted(Path(scratch).iterdir())
+
+        print(f"{'image':<20}{'legacy ms':>11}{'current ms':>12}{'speedup':>9}{'legacy MB':>11}{'current MB':>12}")
+        for path in paths:
+            legacy, current = (run_child(name, path, args.repeat) for name in IMPLEMENTATIONS)
+            print(
+                f"{path.name:<20}{legacy['seconds'] * 1000:>11.1f}{current['seconds'] * 1000:>12.1f}"
+                f"{legacy['seconds'] / current['seconds']:>8.1f}x"
+                f"{legacy['peak_rss_mb']:>11.1f}{current['peak_rss_mb']:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="directory of sample images (defaults to a generated set)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per image; the fastest is reported")
+    parser.add_argument("--make-corpus", metavar="DIR", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", choices=IMPLEMENTATIONS, help=argparse.SUPPRESS)
+    parser.add_argument("path", nargs="?", help=argparse.SUPPRESS)
+    main(parser.parse_args())
@@ -0,0 +1,131 @@
+"""Compare requests per second of the JSON post listing before and after the fast path.
+
+Usage (from the project root):
+
+    python -m benchmarks.listing
+    python -m benchmarks.listing --requests 2000 --limit 100
+
+Runs in-process against a throwaway SQLite database, so the numbers measure the handler,
+query and serialization work rather than the network. The old path is mounted next to
+the new one for the duration of the run.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+from datetime import UTC, datetime, timedelta
+from typing import Annotated
+
+# a private database for the run; settings are read when the app modules are imported
+_scratch = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_scratch.name}/bench.db"
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-that-is-long-enough")
+
+import httpx
+from fastapi import Depends, Query
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from counters import POSTS_COUNTER, POSTS_VERSION_COUNTER, get_counters
+from database import Base, engine, get_db
+from main import app
+from pagination import fetch_post_page
+from schemas import PaginatedPostResponse, PostResponse
+
+
+async def legacy_posts(db: Annotated[AsyncSession, Depends(get_db)], limit: Annotated[int, Query(ge=1, le=100)] = 10):
+    # get_Allpost_api before the fast path: ORM objects, model_validate per row, response_model on top
+    counts = await get_counters(db, POSTS_COUNTER, POSTS_VERSION_COUNTER)
+    posts, has_more, next_cursor = await fetch_post_page(db, limit=limit)
+    return PaginatedPostResponse(
+        posts=[PostResponse.model_validate(post) for post in posts],
+        total=counts[POSTS_COUNTER],
+        skip=0,
+        limit=limit,
+        has_more=has_more,
+        next_cursor=next_cursor,
+    )
+
+
+async def seed(users: int, posts: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(models.User),
+            [
+                {"username": f"user{i}", "email": f"user{i}@example.com", "password_hash": "x", "post_count": 0}
+                for i in range(users)
+            ],
+        )
+        start = datetime(2026, 1, 1, tzinfo=UTC)
+        await conn.execute(
+            insert(models.Post),
+            [
+                {
+                    "title": f"Post {i}",
+                    "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 8,
+                    "user_id": i % users + 1,
+                    "date_posted": start + timedelta(minutes=i),
+                }
+                for i in range(posts)
+            ],
+        )
+        await conn.execute(
+            insert(models.Counter),
+            [{"name": POSTS_COUNTER, "value": posts}, {"name": POSTS_VERSION_COUNTER, "value": 1}],
+        )
+
+
+async def measure(client: httpx.AsyncClient, url: str, requests: int) -> dict[str, float]:
+    for _ in range(min(50, requests)):
+        (await client.get(url)).raise_for_status()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        (await client.get(url)).raise_for_status()
+        latencies.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+async def main(args: argparse.Namespace) -> None:
+    await seed(args.users, args.posts)
+    app.add_api_route("/bench/legacy-posts", legacy_posts, response_model=PaginatedPostResponse)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        old = await client.get(f"/bench/legacy-posts?limit={args.limit}")
+        new = await client.get(f"/api/posts?limit={args.limit}")
+        assert old.json() == new.json(), "the fast path must return the same document"
+
+        results = {
+            "legacy": await measure(client, f"/bench/legacy-posts?limit={args.limit}", args.requests),
+            "fast": await measure(client, f"/api/posts?limit={args.limit}", args.requests),
+        }
+    await engine.dispose()
+
+    print(f"GET /api/posts?limit={args.limit}, {args.requests} requests, {args.posts} posts")
+    print(f"{'path':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}")
+    print(f"speedup: {results['fast']['rps'] / results['legacy']['rps']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,343 @@
+"""Load-test the app over HTTP, one scenario at a time, and report throughput and latency as JSON.
+
+Usage (from the project root; needs uvicorn):
+
+    python -m benchmarks.load                                   # throwaway SQLite file
+    python -m benchmarks.load --database-url postgresql+asyncpg://bench@localhost/bench
+    python -m benchmarks.load --scenarios home,listing_deep --duration 30 --output before.json
+
+The database is migrated and, if it has no users yet, seeded with --users and --posts; the
+dataset and every client's choices follow from --seed, so runs are comparable. The app is
+then served by uvicorn (--workers processes) and each scenario is driven for --duration
+seconds by --concurrency closed-loop clients after a short warm-up. The load generator shares
+the machine with the server, so compare runs made on the same host with the same options.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+
+import httpx
+
+PASSWORD = "benchmark-password"
+
+WORDS = (
+    "fastapi python async database query index cache latency request response server client "
+    "post user page cursor offset replica pool worker template image email token session "
+    "the a of and to in is it for on with as at by from this that be are was"
+).split()
+
+
+@dataclass
+class Context:
+    users: int
+    max_post_id: int
+    depth: int
+
+
+@dataclass
+class Client:
+    http: httpx.AsyncClient
+    rng: random.Random
+    user: int
+    token: str = ""
+    own_post: int = 0
+    cursor: str | None = None
+    pages: int = 0
+    headers: dict = field(default_factory=dict)
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+async def seed(users: int, posts: int, seed_value: int) -> bool:
+    """Fill an empty database; returns False, touching nothing, if it already has users."""
+    # the app reads its settings on import, so it is imported once DATABASE_URL is set
+    from sqlalchemy import func, select
+
+    import models
+    from database import AsyncSessionLocal, engine
+    from scripts.seed import seed as seed_database
+
+    async with AsyncSessionLocal() as db:
+        has_users = await db.scalar(select(func.count()).select_from(models.User))
+    if not has_users:
+        # users get ids 1..users, so their emails are user1@example.com ... user{users}@example.com
+        await seed_database(users=users, posts=posts, seed_value=seed_value, password=PASSWORD)
+    await engine.dispose()
+    return not has_users
+
+
+# Scenarios: one request each; the client's rng picks the target
+
+async def home(ctx: Context, client: Client) -> httpx.Response:
+    return await client.http.get("/")
+
+
+async def post_page(ctx: Context, client: Client) -> httpx.Response:
+    return await client.http.get(f"/posts/{client.rng.randint(1, ctx.max_post_id)}")
+
+
+async def api_post(ctx: Context, client: Client) -> httpx.Response:
+    return await client.http.get(f"/api/posts/{client.rng.randint(1, ctx.max_post_id)}")
+
+
+async def listing_first(ctx: Context, client: Client) -> httpx.Response:
+    return await client.http.get("/api/posts", params={"limit": 10})
+
+
+async def listing_deep(ctx: Context, client: Client) -> httpx.Response:
+    # offset pagination far into the listing, where OFFSET has to skip rows
+    return await client.http.get("/api/posts", params={"limit": 10, "skip": client.rng.randint(0, max(ctx.max_post_id - 10, 0))})
+
+
+async def listing_cursor(ctx: Context, client: Client) -> httpx.Response:
+    # a reader paging through --depth pages with next_cursor, then starting over
+    params = {"limit": 10}
+    if client.cursor:
+        params["cursor"] = client.cursor
+    response = await client.http.get("/api/posts", params=params)
+    client.pages += 1
+    client.cursor = response.json().get("next_cursor") if response.is_success and client.pages < ctx.depth else None
+    if client.cursor is None:
+        client.pages = 0
+    return response
+
+
+async def user_posts(ctx: Context, client: Client) -> httpx.Response:
+    return await client.http.get(f"/users/{client.rng.randint(1, ctx.users)}/posts")
+
+
+async def login(ctx: Context, client: Client) -> httpx.Response:
+    user = client.rng.randint(1, ctx.users)
+    return await client.http.post("/api/users/token", data={"username": f"user{user}@example.com", "password": PASSWORD})
+
+
+async def create_post(ctx: Context, client: Client) -> httpx.Response:
+    rng = client.rng
+    return await client.http.post(
+        "/api/posts",
+        json={"title": words(rng, 5).capitalize(), "content": words(rng, rng.randint(30, 200))},
+        headers=client.headers,
+    )
+
+
+async def update_post(ctx: Context, client: Client) -> httpx.Response:
+    return await client.http.patch(
+        f"/api/posts/{client.own_post}", json={"content": words(client.rng, 50)}, headers=client.headers
+    )
+
+
+async def mixed(ctx: Context, client: Client) -> httpx.Response:
+    scenario = client.rng.choices(list(MIX), weights=list(MIX.values()))[0]
+    return await scenario(ctx, client)
+
+
+Scenario = Callable[[Context, Client], Awaitable[httpx.Response]]
+
+# roughly a read-heavy blog: mostly anonymous page views, the odd login and write
+MIX: dict[Scenario, int] = {
+    home: 30,
+    post_page: 25,
+    api_post: 10,
+    listing_first: 8,
+    listing_deep: 4,
+    listing_cursor: 4,
+    user_posts: 10,
+    login: 1,
+    create_post: 4,
+    update_post: 4,
+}
+
+SCENARIOS: dict[str, Scenario] = {
+    "home": home,
+    "post_page": post_page,
+    "api_post": api_post,
+    "listing_first": listing_first,
+    "listing_deep": listing_deep,
+    "listing_cursor": listing_cursor,
+    "user_posts": user_posts,
+    "login": login,
+    "create_post": create_post,
+    "update_post": update_post,
+    "mixed": mixed,
+}
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    # nearest rank
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+async def drive(ctx: Context, scenario: Scenario, clients: list[Client], duration: float, warmup: float) -> dict:
+    latencies: list[float] = []
+    errors = 0
+
+    async def loop(client: Client, until: float, record: bool) -> None:
+        nonlocal errors
+        while time.perf_counter() < until:
+            started_at = time.perf_counter()
+            try:
+                ok = (await scenario(ctx, client)).status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if record:
+                latencies.append(time.perf_counter() - started_at)
+                errors += not ok
+
+    await asyncio.gather(*(loop(client, time.perf_counter() + warmup, False) for client in clients))
+    started_at = time.perf_counter()
+    await asyncio.gather(*(loop(client, started_at + duration, True) for client in clients))
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    if not latencies:
+        return {"requests": 0, "errors": 0}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+
+
+async def prepare_clients(base_url: str, args: argparse.Namespace) -> tuple[Context, list[Client]]:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    shared = httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60)
+    newest = (await shared.get("/api/posts", params={"limit": 1})).raise_for_status().json()["posts"]
+    ctx = Context(users=args.users, max_post_id=newest[0]["id"] if newest else 1, depth=args.depth)
+
+    clients = []
+    for i in range(args.concurrency):
+        client = Client(http=shared, rng=random.Random(args.seed * 1000 + i), user=i % args.users + 1)
+        # each client writes as its own user, to a post of its own
+        token = await shared.post(
+            "/api/users/token", data={"username": f"user{client.user}@example.com", "password": PASSWORD}
+        )
+        client.token = token.raise_for_status().json()["access_token"]
+        client.headers = {"Authorization": f"Bearer {client.token}"}
+        client.own_post = (await create_post(ctx, client)).raise_for_status().json()["id"]
+        clients.append(client)
+    return ctx, clients
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(base_url: str, server: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f"the server exited with status {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/posts", params={"limit": 1}).is_success:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"the server did not answer within {timeout}s")
+
+
+def git_commit() -> str | None:
+    result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main(args: argparse.Namespace) -> None:
+    scratch = tempfile.TemporaryDirectory()
+    database_url = args.database_url or f"sqlite+aiosqlite:///{scratch.name}/load.db"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-that-is-long-enough")
+
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], check=True, capture_output=True)
+    if not asyncio.run(seed(args.users, args.posts, args.seed)):
+        print("database already has users, reusing its data", file=sys.stderr)
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+    )
+    try:
+        wait_until_up(base_url, server)
+        results = asyncio.run(run_all(base_url, args))
+    finally:
+        server.terminate()
+        server.wait()
+        scratch.cleanup()
+
+    report = {
+        "meta": {
+            "started_at": datetime.now(UTC).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "database": database_url.split(":", 1)[0],
+            **{name: getattr(args, name) for name in ("workers", "concurrency", "duration", "warmup", "users", "posts", "depth", "seed")},
+        },
+        "scenarios": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+async def run_all(base_url: str, args: argparse.Namespace) -> dict[str, dict]:
+    ctx, clients = await prepare_clients(base_url, args)
+    results = {}
+    print(f"{'scenario':<16}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}", file=sys.stderr)
+    for name in args.scenarios:
+        result = results[name] = await drive(ctx, SCENARIOS[name], clients, args.duration, args.warmup)
+        print(
+            f"{name:<16}{result.get('rps', 0):>10.1f}{result.get('p50_ms', 0):>10.2f}"
+            f"{result.get('p95_ms', 0):>10.2f}{result.get('p99_ms', 0):>10.2f}{result['errors']:>8}",
+            file=sys.stderr,
+        )
+    await clients[0].http.aclose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", help="default: a temporary SQLite file")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--posts", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=10, help="measured seconds per scenario")
+    parser.add_argument("--warmup", type=float, default=2, help="unmeasured seconds before each scenario")
+    parser.add_argument("--depth", type=int, default=20, help="pages a cursor reader goes through")
+    parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=list(SCENARIOS),
+        help=f"comma-separated, from: {', '.join(SCENARIOS)}",
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    if unknown := set(args.scenarios) - set(SCENARIOS):
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    main(args)
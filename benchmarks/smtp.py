@@ -0,0 +1,123 @@
+"""Measure outgoing mail throughput, one SMTP session per message versus the pooled sessions.
+
+Usage (from the project root; needs `pip install aiosmtpd`):
+
+    python -m benchmarks.smtp
+    python -m benchmarks.smtp --messages 500 --rtt-ms 30 --concurrency 8
+
+A local aiosmtpd server stands in for the provider. Every SMTP command it answers is
+delayed by --rtt-ms, which is what makes the per-message handshake expensive in production.
+"""
+import argparse
+import asyncio
+import os
+import socket
+import time
+from email.message import EmailMessage
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-that-is-long-enough")
+
+import aiosmtplib
+
+from email_utils import SMTPPool
+
+try:
+    from aiosmtpd.controller import Controller
+    from aiosmtpd.smtp import SMTP as SMTPServer
+except ImportError:
+    Controller = None
+
+
+class SlowSMTPServer(SMTPServer if Controller else object):
+    rtt = 0.0
+
+    async def push(self, status: str) -> None:
+        # each reply arrives one round trip after its command
+        await asyncio.sleep(self.rtt)
+        await super().push(status)
+
+
+class SlowController(Controller if Controller else object):
+    def factory(self) -> SlowSMTPServer:
+        return SlowSMTPServer(self.handler, **self.SMTP_kwargs)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        self.received += 1
+        return "250 Message accepted for delivery"
+
+
+def make_message(i: int) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = "noreply@example.com"
+    message["To"] = f"user{i}@example.com"
+    message["Subject"] = "Reset Your Password - FastAPI Blog"
+    message.set_content("Hi,\n\nYou requested to reset your password.\n" * 10)
+    return message
+
+
+async def run(send, messages: int, concurrency: int) -> float:
+    queue = iter(range(messages))
+
+    async def worker() -> None:
+        for i in queue:
+            await send(make_message(i))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return messages / (time.perf_counter() - started)
+
+
+async def main(args: argparse.Namespace) -> None:
+    SlowSMTPServer.rtt = args.rtt_ms / 1000
+    handler = CountingHandler()
+    host, port = "127.0.0.1", free_port()
+    controller = SlowController(handler, hostname=host, port=port)
+    controller.start()
+    try:
+        async def send_unpooled(message: EmailMessage) -> None:
+            # email_utils.send_email before the pool
+            await aiosmtplib.send(message, hostname=host, port=port, start_tls=False)
+
+        pool = SMTPPool(
+            hostname=host,
+            port=port,
+            username=None,
+            password=None,
+            start_tls=False,
+            max_connections=args.concurrency,
+            idle_timeout=60,
+            max_messages_per_connection=100,
+            timeout=30,
+        )
+        unpooled = await run(send_unpooled, args.messages, args.concurrency)
+        pooled = await run(pool.send, args.messages, args.concurrency)
+        await pool.close()
+    finally:
+        controller.stop()
+
+    print(f"{args.messages} messages, concurrency {args.concurrency}, {args.rtt_ms}ms per SMTP round trip")
+    print(f"{'unpooled':<10}{unpooled:>10.1f} msg/s")
+    print(f"{'pooled':<10}{pooled:>10.1f} msg/s   ({pool.stats['connections_opened']} connections opened)")
+    print(f"received {handler.received} of {2 * args.messages}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rtt-ms", type=float, default=20)
+    if Controller is None:
+        parser.error("aiosmtpd is not installed: pip install aiosmtpd")
+    asyncio.run(main(parser.parse_args()))
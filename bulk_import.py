@@ -0,0 +1,110 @@
+import json
+import logging
+from collections.abc import AsyncIterator
+from typing import IO
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from cache import invalidate_post_pages
+from counters import record_post_change
+from schemas import PostCreate
+from search import index_posts
+
+logger = logging.getLogger(__name__)
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[tuple[int, bytes | None]]:
+    """Split a byte stream into numbered lines, holding at most one line in memory.
+
+    A line longer than max_line_bytes is dropped as it streams in and reported as None.
+    """
+    line_no = 0
+    buffer = bytearray()
+    oversized = False
+    async for chunk in chunks:
+        start = 0
+        while (end := chunk.find(b"\n", start)) != -1:
+            line_no += 1
+            if oversized or len(buffer) + end - start > max_line_bytes:
+                yield line_no, None
+            else:
+                buffer += chunk[start:end]
+                yield line_no, bytes(buffer)
+            buffer.clear()
+            oversized = False
+            start = end + 1
+        if not oversized:
+            buffer += chunk[start:]
+            if len(buffer) > max_line_bytes:
+                buffer.clear()
+                oversized = True
+    if buffer or oversized:
+        yield line_no + 1, None if oversized else bytes(buffer)
+
+
+def _write(report: IO[bytes], record: dict) -> None:
+    report.write(json.dumps(record, default=str).encode() + b"\n")
+
+
+async def import_posts(
+    db: AsyncSession,
+    chunks: AsyncIterator[bytes],
+    *,
+    user_id: int,
+    batch_size: int,
+    max_line_bytes: int,
+    report: IO[bytes],
+) -> dict[str, int]:
+    """Insert the NDJSON posts in chunks for user_id, committing once per batch.
+
+    Every rejected line is written to report as {"line": n, ...}; the summary is returned.
+    """
+    imported = failed = 0
+    batch: list[tuple[int, dict]] = []
+
+    async def flush() -> None:
+        nonlocal imported, failed
+        rows = [row for _, row in batch]
+        try:
+            # a single executemany; RETURNING gives the ids the search index needs
+            result = await db.execute(insert(models.Post).returning(models.Post.id, sort_by_parameter_order=True), rows)
+            post_ids = result.scalars().all()
+            await index_posts(db, [(post_id, row["title"], row["content"]) for post_id, row in zip(post_ids, rows)])
+            await record_post_change(db, user_id, len(rows))
+            await db.commit()
+        except SQLAlchemyError:
+            await db.rollback()
+            logger.exception("Bulk import batch failed")
+            for line_no, _ in batch:
+                _write(report, {"line": line_no, "error": "Database error while inserting this batch"})
+            failed += len(batch)
+        else:
+            imported += len(rows)
+        batch.clear()
+
+    async for line_no, line in iter_lines(chunks, max_line_bytes):
+        if line is None:
+            _write(report, {"line": line_no, "error": f"Line exceeds {max_line_bytes} bytes"})
+            failed += 1
+            continue
+        if not line.strip():
+            continue
+        try:
+            post = PostCreate.model_validate_json(line)
+        except ValidationError as err:
+            _write(report, {"line": line_no, "errors": err.errors(include_url=False, include_context=False, include_input=False)})
+            failed += 1
+            continue
+        batch.append((line_no, {"title": post.title, "content": post.content, "user_id": user_id}))
+        if len(batch) >= batch_size:
+            await flush()
+
+    if batch:
+        await flush()
+    if imported:
+        invalidate_post_pages(None, user_id, listings=True)
+    return {"imported": imported, "failed": failed}
@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable, Iterable
+from typing import Any
+
+from config import settings
+
+
+class TTLCache:
+    """In-process LRU cache whose entries also expire ttl seconds after being stored.
+
+    Entries may carry tags so that every entry depending on, say, one post can be dropped
+    at once. Everything runs on the event loop without awaiting, so no locking is needed.
+    Each worker process has its own cache; the TTL bounds how long another worker can
+    serve something this one has already invalidated.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any, frozenset[str]]] = OrderedDict()
+        self._tagged: dict[str, set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value, _ = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        if key in self._entries:
+            self._remove(key)
+        tags = frozenset(tags)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tagged.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key: Hashable) -> None:
+        if key in self._entries:
+            self._remove(key)
+
+    def invalidate_tags(self, *tags: str) -> None:
+        for tag in tags:
+            for key in list(self._tagged.get(tag, ())):
+                self._remove(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._tagged.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tagged.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tagged[tag]
+
+
+# Rendered HTML of the public pages, which look the same for every visitor
+page_cache = TTLCache(maxsize=settings.page_cache_max_entries, ttl=settings.page_cache_ttl_seconds)
+
+# Tags a cached page can carry. A page showing a post is tagged with the post and its author,
+# a listing page additionally with the listing it belongs to, so a new post only evicts listings.
+ALL_POSTS_TAG = "listing:all"
+
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def user_tag(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def user_posts_tag(user_id: int) -> str:
+    return f"listing:user:{user_id}"
+
+
+def post_page_tags(posts: Iterable[Any]) -> set[str]:
+    tags = set()
+    for post in posts:
+        tags.add(post_tag(post.id))
+        tags.add(user_tag(post.user_id))
+    return tags
+
+
+def invalidate_post_pages(post_id: int | None, author_id: int, *, listings: bool) -> None:
+    """Drop cached pages showing a post; listings=True when posts were added or removed."""
+    tags = []
+    if post_id is not None:
+        tags.append(post_tag(post_id))
+    if listings:
+        tags += [ALL_POSTS_TAG, user_posts_tag(author_id)]
+    page_cache.invalidate_tags(*tags)
+
+
+def invalidate_user_pages(user_id: int) -> None:
+    """Drop cached pages showing a user's name or picture."""
+    page_cache.invalidate_tags(user_tag(user_id), user_posts_tag(user_id))
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import SecretStr
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -8,15 +10,64 @@ class Settings(BaseSettings):
     )
 
     database_url: str
+    # pool settings left unset get a per-dialect default, see database.DIALECT_DEFAULTS
+    database_pool_size: int | None = None
+    database_max_overflow: int | None = None
+    database_pool_recycle_seconds: int | None = None
+    database_pool_pre_ping: bool | None = None
+    database_pool_timeout_seconds: float = 30
+    database_connect_timeout_seconds: float = 10
+    # SQLAlchemy's per-connection cache of prepared statements (asyncpg only)
+    database_statement_cache_size: int = 100
+    # behind PgBouncer in transaction mode: no prepared statement outlives its transaction
+    database_pgbouncer: bool = False
+    # read-only handlers are spread over these, round robin, e.g. '["postgresql+asyncpg://..."]'
+    database_replica_urls: list[str] = []
+    database_read_your_writes_seconds: int = 5
+
+    # per-request query count and DB time in a Server-Timing header (always in the request log)
+    query_stats_header: bool = True
+    # level of the per-request log line's logger, "query_stats"; WARNING silences it
+    query_stats_log_level: str = "INFO"
+    # "log" or "raise" when one request runs the same statement more than the threshold
+    query_repeat_mode: Literal["off", "log", "raise"] = "off"
+    query_repeat_threshold: int = 10
 
     secret_key: SecretStr
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    # bearer token for operator endpoints such as /internal/stats; unset, only loopback clients get in
+    internal_api_token: SecretStr = SecretStr("")
+
+    user_cache_max_entries: int = 10_000
+    user_cache_ttl_seconds: float = 30
+
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 64
+    password_hash_queue_timeout_seconds: float = 5
 
     max_upload_size_bytes: int = 5 * 1024 * 1024
+    max_image_pixels: int = 50_000_000
+    profile_image_avif: bool = False
+    image_workers: int = 2
+    image_max_queue: int = 16
+    image_queue_timeout_seconds: float = 10
+    image_task_timeout_seconds: float = 30
+    # unreferenced pictures newer than this are left to scripts/sweep_profile_images.py
+    profile_image_grace_seconds: float = 3600
 
     posts_per_page: int = 10
 
+    page_cache_max_entries: int = 512
+    page_cache_ttl_seconds: float = 30
+
+    likes_flush_interval_seconds: float = 1
+
+    export_max_concurrent: int = 2
+
+    import_batch_size: int = 1000
+    import_max_line_bytes: int = 1024 * 1024
+
     reset_token_expire_minutes: int = 60
 
     mail_server: str = "localhost"
@@ -25,6 +76,16 @@ class Settings(BaseSettings):
     mail_password: SecretStr = SecretStr("")
     mail_from: str = "noreply@example.com"
     mail_use_tls: bool = True
+    mail_timeout_seconds: float = 30
+    mail_pool_size: int = 4
+    mail_pool_idle_timeout_seconds: float = 60
+    mail_pool_max_messages_per_connection: int = 100
+
+    outbox_poll_interval_seconds: float = 5
+    outbox_batch_size: int = 50
+    outbox_max_attempts: int = 8
+    outbox_retry_base_seconds: float = 30
+    outbox_retry_max_seconds: float = 3600
 
     frontend_url: str = "http://localhost:8000"
 
@@ -0,0 +1,50 @@
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+# names of the rows in the counters table
+POSTS_COUNTER = "posts"  # total number of posts
+POSTS_VERSION_COUNTER = "posts_version"  # bumped whenever the global post listing changes
+
+
+async def get_counter(db: AsyncSession, name: str) -> int:
+    result = await db.execute(select(models.Counter.value).where(models.Counter.name == name))
+    return result.scalar() or 0
+
+
+async def get_counters(db: AsyncSession, *names: str) -> dict[str, int]:
+    result = await db.execute(
+        select(models.Counter.name, models.Counter.value).where(models.Counter.name.in_(names)),
+    )
+    values = dict(result.tuples().all())
+    return {name: values.get(name, 0) for name in names}
+
+
+async def adjust_counter(db: AsyncSession, name: str, delta: int) -> None:
+    await db.execute(
+        update(models.Counter)
+        .where(models.Counter.name == name)
+        .values(value=models.Counter.value + delta),
+    )
+
+
+async def record_post_change(db: AsyncSession, user_id: int, count_delta: int = 0) -> None:
+    """Bump the listing versions after a post by user_id was written, adjusting post counts by count_delta.
+
+    Runs inside the caller's transaction so the counters commit or roll back together
+    with the posts they describe.
+    """
+    await adjust_counter(db, POSTS_VERSION_COUNTER, 1)
+    if count_delta:
+        await adjust_counter(db, POSTS_COUNTER, count_delta)
+    await db.execute(
+        update(models.User)
+        .where(models.User.id == user_id)
+        .values(
+            post_count=models.User.post_count + count_delta,
+            posts_version=models.User.posts_version + 1,
+            # the profile itself did not change, so keep onupdate from touching it
+            updated_at=models.User.updated_at,
+        ),
+    )
@@ -1,9 +1,123 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import itertools
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from collections.abc import Callable
+from typing import Any
+
+from fastapi import Request
+from sqlalchemy import exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from config import settings
 
 
-engine = create_async_engine(settings.database_url)
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    timeouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records how long each checkout waited for a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        # called with (wait_seconds, timed_out) after every checkout attempt
+        self.observers: list[Callable[[float, bool], None]] = []
+
+    def recreate(self) -> "TimedQueuePool":
+        pool = super().recreate()
+        pool.stats = self.stats
+        pool.observers = self.observers
+        return pool
+
+    def _do_get(self):
+        started_at = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            timed_out = True
+            raise
+        finally:
+            # includes opening a new connection when the pool grows
+            wait = time.perf_counter() - started_at
+            self.stats.checkouts += 1
+            self.stats.wait_seconds_total += wait
+            self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, wait)
+            for observer in self.observers:
+                observer(wait, timed_out)
+
+
+# Per-dialect defaults for the pool settings left unset. SQLite is a local file: connections
+# are cheap and never go stale, and writers serialize anyway. Postgres sits behind a network
+# and often a proxy that drops idle connections, so they are pinged and recycled.
+DIALECT_DEFAULTS = {
+    "sqlite": {"pool_size": 5, "max_overflow": 5, "pool_recycle": -1, "pool_pre_ping": False},
+    "postgresql": {"pool_size": 10, "max_overflow": 10, "pool_recycle": 1800, "pool_pre_ping": True},
+}
+
+
+def engine_options(database_url: str) -> dict[str, Any]:
+    url = make_url(database_url)
+    backend = url.get_backend_name()
+    defaults = DIALECT_DEFAULTS.get(backend, DIALECT_DEFAULTS["postgresql"])
+    configured = {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+        "pool_pre_ping": settings.database_pool_pre_ping,
+    }
+    options = {name: defaults[name] if value is None else value for name, value in configured.items()}
+    options["pool_timeout"] = settings.database_pool_timeout_seconds
+
+    if not issubclass(url.get_dialect().get_pool_class(url), QueuePool):
+        # e.g. in-memory SQLite, which must keep its single shared connection
+        return {}
+    options["poolclass"] = TimedQueuePool
+
+    if backend == "sqlite":
+        # how long a write waits on another writer's lock before "database is locked"
+        options["connect_args"] = {"timeout": settings.database_connect_timeout_seconds}
+    elif url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "timeout": settings.database_connect_timeout_seconds,
+            "prepared_statement_cache_size": settings.database_statement_cache_size,
+        }
+        if settings.database_pgbouncer:
+            # consecutive transactions may land on different server connections, so neither
+            # SQLAlchemy nor asyncpg may reuse a prepared statement, and each needs a name no
+            # other client of the same server connection can have used
+            options["connect_args"].update(
+                prepared_statement_cache_size=0,
+                statement_cache_size=0,
+                prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__",
+            )
+    return options
+
+
+def pool_snapshot(engine: AsyncEngine) -> dict[str, Any]:
+    pool = engine.pool
+    if not isinstance(pool, TimedQueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        **asdict(pool.stats),
+    }
+
+
+engine = create_async_engine(settings.database_url, **engine_options(settings.database_url))
 
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -11,9 +125,36 @@ AsyncSessionLocal = async_sessionmaker(
     expire_on_commit=False,
 )
 
+# One engine per read replica, each with its own pool; empty when there are none
+replica_engines = [create_async_engine(url, **engine_options(url)) for url in settings.database_replica_urls]
+_replica_sessions = itertools.cycle([
+    async_sessionmaker(replica, class_=AsyncSession, expire_on_commit=False) for replica in replica_engines
+])
+
+# Set by ReadYourWritesMiddleware after a write; while present, reads go to the primary
+PRIMARY_PIN_COOKIE = "db_primary"
+
+
+def read_sessionmaker(pinned: bool = False) -> async_sessionmaker[AsyncSession]:
+    """The next replica's sessionmaker, round robin, or the primary's if pinned or without replicas."""
+    if pinned or not replica_engines:
+        return AsyncSessionLocal
+    return next(_replica_sessions)
+
+
 class Base(DeclarativeBase):
     pass
 
 async def get_db():
     async with AsyncSessionLocal() as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_read_db(request: Request):
+    """Session for handlers that only read, served by a replica when one is configured.
+
+    Replicas lag the primary, so a client that has just written is pinned to the primary
+    for database_read_your_writes_seconds and sees its own changes.
+    """
+    async with read_sessionmaker(PRIMARY_PIN_COOKIE in request.cookies)() as session:
+        yield session
@@ -1,13 +1,187 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator, Callable
+from contextlib import asynccontextmanager, suppress
 from email.message import EmailMessage
 import aiosmtplib
 from fastapi.templating import Jinja2Templates
+from jinja2 import Template
 from config import settings
 
 
 templates = Jinja2Templates(directory="templates")
 
+logger = logging.getLogger(__name__)
 
-async def send_email(to_email: str, subject: str, plain_text: str, html_content: str | None = None) -> None:
+# A connection idle for longer than this is checked with NOOP before it is reused
+HEALTH_CHECK_AFTER_SECONDS = 5
+
+
+class SMTPPool:
+    """Keeps authenticated SMTP sessions open so messages skip the connect/STARTTLS/AUTH handshake.
+
+    At most max_connections sessions exist at once, which also caps concurrent sends. A
+    session is closed once it has been idle for idle_timeout or has sent
+    max_messages_per_connection messages, since providers limit both.
+    """
+
+    def __init__(
+        self,
+        *,
+        hostname: str,
+        port: int,
+        username: str | None,
+        password: str | None,
+        start_tls: bool,
+        max_connections: int,
+        idle_timeout: float,
+        max_messages_per_connection: int,
+        timeout: float,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.max_messages_per_connection = max_messages_per_connection
+        self.timeout = timeout
+        # (connection, messages sent on it, last used), most recently used last
+        self._idle: list[tuple[aiosmtplib.SMTP, int, float]] = []
+        self._slots: asyncio.Semaphore | None = None
+        self._reaper: asyncio.Task | None = None
+        self.stats = {"connections_opened": 0, "connections_closed": 0, "sent": 0, "failed": 0}
+        # called with (outcome, seconds) after every send, outcome being "sent" or "failed"
+        self.observers: list[Callable[[str, float], None]] = []
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            start_tls=self.start_tls,
+            timeout=self.timeout,
+        )
+        # logs in as well when a username is set
+        await client.connect()
+        self.stats["connections_opened"] += 1
+        return client
+
+    async def _close(self, client: aiosmtplib.SMTP) -> None:
+        self.stats["connections_closed"] += 1
+        try:
+            await client.quit()
+        except (aiosmtplib.SMTPException, OSError):
+            client.close()
+
+    async def _checkout(self) -> tuple[aiosmtplib.SMTP, int]:
+        while self._idle:
+            client, sent, last_used = self._idle.pop()
+            idle = time.monotonic() - last_used
+            if idle > self.idle_timeout or not client.is_connected:
+                await self._close(client)
+                continue
+            if idle > HEALTH_CHECK_AFTER_SECONDS:
+                try:
+                    await client.noop()
+                except (aiosmtplib.SMTPException, OSError):
+                    await self._close(client)
+                    continue
+            return client, sent
+        return await self._connect(), 0
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[aiosmtplib.SMTP]:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        async with self._slots:
+            client, sent = await self._checkout()
+            try:
+                yield client
+            except BaseException:
+                # the session may be mid-transaction; never hand it to the next sender
+                await self._close(client)
+                raise
+            if sent + 1 >= self.max_messages_per_connection:
+                await self._close(client)
+            else:
+                self._idle.append((client, sent + 1, time.monotonic()))
+
+    async def send(self, message: EmailMessage) -> None:
+        started_at = time.perf_counter()
+        # a pooled session may have been dropped by the server since it was last used; retry once on a fresh one
+        for attempt in range(2):
+            try:
+                async with self.connection() as client:
+                    await client.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                if attempt:
+                    self._finish("failed", started_at)
+                    raise
+            except Exception:
+                self._finish("failed", started_at)
+                raise
+            else:
+                self._finish("sent", started_at)
+                return
+
+    def _finish(self, outcome: str, started_at: float) -> None:
+        self.stats[outcome] += 1
+        elapsed = time.perf_counter() - started_at
+        for observer in self.observers:
+            observer(outcome, elapsed)
+
+    async def _prune(self) -> None:
+        now = time.monotonic()
+        expired = [entry for entry in self._idle if now - entry[2] > self.idle_timeout]
+        self._idle = [entry for entry in self._idle if now - entry[2] <= self.idle_timeout]
+        for client, _, _ in expired:
+            await self._close(client)
+
+    async def _run(self) -> None:
+        # closes idle sessions promptly rather than on the next send, freeing the server's slots
+        while True:
+            await asyncio.sleep(self.idle_timeout / 2)
+            try:
+                await self._prune()
+            except Exception:
+                logger.exception("Failed to close idle SMTP connections")
+
+    def start(self) -> None:
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        if self._reaper is not None:
+            self._reaper.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._reaper
+            self._reaper = None
+        idle, self._idle = self._idle, []
+        for client, _, _ in idle:
+            await self._close(client)
+
+    def snapshot(self) -> dict:
+        return {"max_connections": self.max_connections, "idle": len(self._idle), **self.stats}
+
+
+smtp_pool = SMTPPool(
+    hostname=settings.mail_server,
+    port=settings.mail_port,
+    username=settings.mail_username or None,
+    password=settings.mail_password.get_secret_value() or None,
+    start_tls=settings.mail_use_tls,
+    max_connections=settings.mail_pool_size,
+    idle_timeout=settings.mail_pool_idle_timeout_seconds,
+    max_messages_per_connection=settings.mail_pool_max_messages_per_connection,
+    timeout=settings.mail_timeout_seconds,
+)
+
+
+def build_email(to_email: str, subject: str, plain_text: str, html_content: str | None = None) -> EmailMessage:
     message = EmailMessage()
     message["From"] = settings.mail_from  # Updated to mail_from
     message["To"] = to_email
@@ -18,20 +192,19 @@ async def send_email(to_email: str, subject: str, plain_text: str, html_content:
     if html_content:
         message.add_alternative(html_content, subtype="html")
 
-    await aiosmtplib.send(
-        message,
-        hostname=settings.mail_server,
-        port=settings.mail_port,
-        username=settings.mail_username if settings.mail_username else None,
-        password=settings.mail_password.get_secret_value() or None,
-        start_tls=settings.mail_use_tls
-    )
+    return message
 
 
-async def send_password_reset_email(to_email: str, username: str, token: str) -> None:
+async def send_email(to_email: str, subject: str, plain_text: str, html_content: str | None = None) -> None:
+    await smtp_pool.send(build_email(to_email, subject, plain_text, html_content))
+
+
+PASSWORD_RESET_TEMPLATE = "email/password_reset.html"
+
+
+def password_reset_email(template: Template, to_email: str, username: str, token: str) -> EmailMessage:
     reset_url = f"{settings.frontend_url}/reset-password?token={token}"
 
-    template = templates.env.get_template("email/password_reset.html")
     html_content = template.render(reset_url=reset_url, username=username)
 
     plain_text = f"""Hi {username},
@@ -48,4 +221,9 @@ async def send_password_reset_email(to_email: str, username: str, token: str) ->
     The FastAPI Blog Team
     """
 
-    await send_email(to_email=to_email, subject="Reset Your Password - FastAPI Blog", plain_text=plain_text, html_content=html_content)
+    return build_email(to_email=to_email, subject="Reset Your Password - FastAPI Blog", plain_text=plain_text, html_content=html_content)
+
+
+async def send_password_reset_email(to_email: str, username: str, token: str) -> None:
+    template = templates.env.get_template(PASSWORD_RESET_TEMPLATE)
+    await smtp_pool.send(password_reset_email(template, to_email, username, token))
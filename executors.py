@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, TypeVar
+
+T = TypeVar("T")
+
+
+class ExecutorBusy(Exception):
+    """The pool's queue is full or the task waited too long for a worker."""
+
+
+class ExecutorTimeout(Exception):
+    """The task ran longer than the pool's task timeout."""
+
+
+@dataclass
+class ExecutorStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    timed_out: int = 0
+    queue_depth: int = 0
+    running: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+    run_seconds_total: float = 0.0
+    run_seconds_max: float = 0.0
+
+
+class BoundedExecutor:
+    """A dedicated worker pool for CPU-heavy calls made from async handlers.
+
+    At most max_workers calls run at once and at most max_queue wait for a slot. A call
+    that finds the queue full, or waits longer than queue_timeout, raises ExecutorBusy
+    straight away so the handler can answer 503 instead of piling up latency.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        max_workers: int,
+        max_queue: int,
+        queue_timeout: float,
+        task_timeout: float | None = None,
+        processes: bool = False,
+    ):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.task_timeout = task_timeout
+        self.processes = processes
+        self.stats = ExecutorStats()
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        # on_discard tasks, referenced until they finish
+        self._discards: set[asyncio.Task] = set()
+        # called with (name, wait_seconds, run_seconds, outcome) after every task
+        self.observers: list[Callable[[str, float, float, str], None]] = []
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        if self.processes:
+            # spawned rather than forked: the server process already runs an event loop and threads
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+        self._slots = asyncio.Semaphore(self.max_workers)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+            self._slots = None
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"max_workers": self.max_workers, "max_queue": self.max_queue, **asdict(self.stats)}
+
+    async def run(
+        self,
+        fn: Callable[..., T],
+        *args: Any,
+        cleanup: Callable[[], None] | None = None,
+        on_discard: Callable[[T], Awaitable[None]] | None = None,
+    ) -> T:
+        """Run fn(*args) on the pool and return its result.
+
+        cleanup is called once the arguments are no longer needed: when the call has finished,
+        or straight away if it never started. A call that completes after run() gave up on it
+        (timeout, cancelled caller) has its result passed to on_discard, which runs as a task.
+        """
+        self.start()
+        stats = self.stats
+        stats.submitted += 1
+        future = None
+        try:
+            if stats.queue_depth >= self.max_queue:
+                self._finish(0.0, 0.0, "rejected")
+                raise ExecutorBusy(f"{self.name} queue is full")
+
+            queued_at = time.perf_counter()
+            stats.queue_depth += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+            except TimeoutError as err:
+                self._finish(time.perf_counter() - queued_at, 0.0, "rejected")
+                raise ExecutorBusy(f"{self.name} queue wait exceeded {self.queue_timeout}s") from err
+            finally:
+                stats.queue_depth -= 1
+
+            started_at = time.perf_counter()
+            wait = started_at - queued_at
+            stats.running += 1
+            slots = self._slots
+            try:
+                future = asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+            except BaseException:
+                stats.running -= 1
+                slots.release()
+                self._finish(wait, 0.0, "failed")
+                raise
+        finally:
+            if future is None and cleanup is not None:
+                cleanup()
+
+        abandoned = False
+
+        def release(finished: asyncio.Future) -> None:
+            # a started worker call cannot be interrupted, so its slot comes back only once
+            # the call really returns, not when the caller stops waiting for it
+            stats.running -= 1
+            slots.release()
+            if cleanup is not None:
+                cleanup()
+            if abandoned and on_discard is not None and not finished.cancelled() and finished.exception() is None:
+                task = asyncio.create_task(on_discard(finished.result()))
+                self._discards.add(task)
+                task.add_done_callback(self._discards.discard)
+
+        future.add_done_callback(release)
+        outcome = "failed"
+        try:
+            # shielded, so a timeout or a cancelled caller leaves the call running and counted
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=self.task_timeout)
+            outcome = "completed"
+            return result
+        except TimeoutError as err:
+            abandoned = True
+            outcome = "timed_out"
+            raise ExecutorTimeout(f"{self.name} task exceeded {self.task_timeout}s") from err
+        except asyncio.CancelledError:
+            abandoned = True
+            raise
+        finally:
+            self._finish(wait, time.perf_counter() - started_at, outcome)
+
+    def _finish(self, wait: float, run: float, outcome: str) -> None:
+        stats = self.stats
+        setattr(stats, outcome, getattr(stats, outcome) + 1)
+        stats.wait_seconds_total += wait
+        stats.wait_seconds_max = max(stats.wait_seconds_max, wait)
+        if outcome != "rejected":
+            stats.run_seconds_total += run
+            stats.run_seconds_max = max(stats.run_seconds_max, run)
+        for observer in self.observers:
+            observer(self.name, wait, run, outcome)
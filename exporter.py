@@ -0,0 +1,135 @@
+import asyncio
+import csv
+import io
+import json
+from collections.abc import AsyncIterator
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.types import Receive, Scope, Send
+
+import models
+from config import settings
+from database import read_sessionmaker
+
+# Rows fetched from the server-side cursor per round trip
+EXPORT_BATCH_SIZE = 1000
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+POST_FIELDS = ("id", "title", "content", "user_id", "author", "date_posted", "updated_at", "likes")
+USER_FIELDS = ("id", "username", "image_file", "post_count")
+
+# Each export holds a pooled connection and a server-side cursor for the whole download, so
+# only this many run at once per process; ExportResponse answers 503 when none is free
+export_slots = asyncio.Semaphore(settings.export_max_concurrent)
+
+
+def posts_export_query(user_id: int | None = None, since: datetime | None = None, until: datetime | None = None):
+    # Plain columns rather than ORM objects: nothing is added to an identity map, so memory stays flat
+    query = (
+        select(
+            models.Post.id,
+            models.Post.title,
+            models.Post.content,
+            models.Post.user_id,
+            models.User.username.label("author"),
+            models.Post.date_posted,
+            models.Post.updated_at,
+            models.Post.likes,
+        )
+        .join(models.User, models.Post.user_id == models.User.id)
+        .order_by(models.Post.id)
+    )
+    if user_id is not None:
+        query = query.where(models.Post.user_id == user_id)
+    if since is not None:
+        query = query.where(models.Post.date_posted >= since)
+    if until is not None:
+        query = query.where(models.Post.date_posted < until)
+    return query
+
+
+def users_export_query():
+    return select(*(getattr(models.User, field) for field in USER_FIELDS)).order_by(models.User.id)
+
+
+async def stream_batches(session: AsyncSession, query) -> AsyncIterator[list[dict]]:
+    """Yield the query's rows in batches straight off a server-side cursor."""
+    result = await session.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    async for partition in result.mappings().partitions():
+        yield [dict(row) for row in partition]
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def encode_ndjson(rows: list[dict]) -> bytes:
+    return b"".join(
+        json.dumps({key: _value(value) for key, value in row.items()}).encode() + b"\n" for row in rows
+    )
+
+
+def encode_csv(rows: list[dict], fields: tuple[str, ...], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(fields)
+    writer.writerows([_value(row[field]) for field in fields] for row in rows)
+    return buffer.getvalue().encode()
+
+
+async def export_rows(query, fields: tuple[str, ...], fmt: str) -> AsyncIterator[bytes]:
+    """Stream a whole table as NDJSON or CSV, one chunk per batch.
+
+    Opens its own session because the response outlives the request's dependencies. A
+    full export tolerates replica lag, so it always goes to a replica if there is one.
+    """
+    async with read_sessionmaker()() as session:
+        if fmt == "csv":
+            yield encode_csv([], fields, header=True)
+        async for rows in stream_batches(session, query):
+            yield encode_csv(rows, fields) if fmt == "csv" else encode_ndjson(rows)
+
+
+def export_posts(fmt: str, user_id: int | None = None, since: datetime | None = None, until: datetime | None = None) -> AsyncIterator[bytes]:
+    return export_rows(posts_export_query(user_id, since, until), POST_FIELDS, fmt)
+
+
+def export_users(fmt: str) -> AsyncIterator[bytes]:
+    return export_rows(users_export_query(), USER_FIELDS, fmt)
+
+
+class ExportResponse(StreamingResponse):
+    """Stream an export while holding one of export_slots, or answer 503 when none is free.
+
+    The slot is taken only once the response is sent, so a response that is never sent holds
+    nothing. The body is closed explicitly, so a client that disconnects mid-download returns
+    its connection right away instead of whenever the generator gets collected.
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], fmt: str, name: str):
+        super().__init__(
+            content,
+            media_type=FORMATS[fmt],
+            headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if export_slots.locked():
+            await self.body_iterator.aclose()
+            # raised before anything is sent, so the app's exception handlers render it
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many exports in progress. Please try again shortly.",
+                headers={"Retry-After": "30"},
+            )
+        async with export_slots:
+            try:
+                await super().__call__(scope, receive, send)
+            finally:
+                await self.body_iterator.aclose()
@@ -1,28 +1,207 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
 import uuid
-from io import BytesIO
+from collections.abc import Iterator
+from contextlib import suppress
 from pathlib import Path
 
-from PIL import Image, ImageOps
+from PIL import Image, ImageOps, features
+
+from config import settings
+from executors import BoundedExecutor
 
 PROFILE_PICS_DIR = Path("media/profile_pics")
 
-def process_profile_image(content: bytes) -> str:
-    with Image.open(BytesIO(content)) as original:
-        img = ImageOps.exif_transpose(original)
+PROFILE_IMAGE_SIZE = 300
+
+# Widths stored for srcset; avatars render at 64-100 CSS px, so the small ones cover 1x and 2x screens
+PROFILE_IMAGE_SIZES = (72, 144, PROFILE_IMAGE_SIZE)
+
+# MIME type -> (extension, Pillow format, save options), in the order browsers should prefer them.
+# AVIF is opt-in: it needs a Pillow built with libavif and is much slower to encode.
+VARIANT_FORMATS = {
+    "image/avif": ("avif", "AVIF", {"quality": 60}),
+    "image/webp": ("webp", "WEBP", {"quality": 80, "method": 6}),
+    "image/jpeg": ("jpg", "JPEG", {"quality": 85, "optimize": True, "progressive": True}),
+}
+
+# {sha256}.jpg, or {sha256}-avif.jpg when AVIF variants were written as well
+VARIANT_NAME = re.compile(r"[0-9a-f]{64}(?P<avif>-avif)?\.jpg")
+
+# Modes Image.reduce accepts; palette and bilevel images are converted first
+REDUCIBLE_MODES = {"L", "LA", "RGB", "RGBA", "CMYK"}
+
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+# Decoding and encoding hold the GIL for long stretches, so pictures are processed in worker
+# processes, apart from the threads that serve requests
+image_executor = BoundedExecutor(
+    "image",
+    max_workers=settings.image_workers,
+    max_queue=settings.image_max_queue,
+    queue_timeout=settings.image_queue_timeout_seconds,
+    task_timeout=settings.image_task_timeout_seconds,
+    processes=True,
+)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class ImageTooLarge(Exception):
+    pass
+
+
+async def spool_upload(file, max_bytes: int) -> Path:
+    """Copy an upload to a temp file in chunks, giving up as soon as it exceeds max_bytes.
+
+    Only one chunk is in memory at a time; the caller must delete the returned file.
+    """
+    size = 0
+    with tempfile.NamedTemporaryFile(prefix="upload-", delete=False) as spool:
+        path = Path(spool.name)
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            path.unlink(missing_ok=True)
+            raise
+    return path
+
+
+def probe_image(img: Image.Image, max_pixels: int) -> None:
+    # Image.open only parses the header, so the size is known before any pixel is decoded
+    width, height = img.size
+    if width * height > max_pixels:
+        raise ImageTooLarge(f"{width}x{height} exceeds the {max_pixels} pixel limit")
+
+
+def open_downscaled(img: Image.Image, size: int) -> Image.Image:
+    """Decode img at the smallest scale that still leaves its short side at least twice size.
+
+    JPEGs are decoded straight at 1/2, 1/4 or 1/8 scale; other formats are decoded in full and
+    box-reduced by an integer factor, so the LANCZOS pass only sees a small image either way.
+    """
+    img.draft("RGB", (size * 2, size * 2))
+    factor = min(img.size) // (size * 2)
+    if factor > 1:
+        if img.mode not in REDUCIBLE_MODES:
+            img = img.convert("RGB")
+        return img.reduce(factor)
+    img.load()
+    return img
+
+
+def variant_filename(stem: str, size: int, extension: str) -> str:
+    return f"{stem}-{size}.{extension}"
+
+
+def profile_image_variants(image_file: str) -> dict[str, list[tuple[str, int]]]:
+    """Map each MIME type stored for image_file to its (filename, width) variants, smallest first.
+
+    Pictures uploaded before variants existed have a uuid name and map to nothing.
+    """
+    match = VARIANT_NAME.fullmatch(image_file)
+    if match is None:
+        return {}
+    stem = image_file.removesuffix(".jpg")
+    variants = {
+        mime_type: [(variant_filename(stem, size, extension), size) for size in PROFILE_IMAGE_SIZES]
+        for mime_type, (extension, _, _) in VARIANT_FORMATS.items()
+        if mime_type != "image/avif" or match["avif"]
+    }
+    # the full-size JPEG is image_file itself
+    variants["image/jpeg"][-1] = (image_file, PROFILE_IMAGE_SIZE)
+    return variants
+
+
+def _save(img: Image.Image, path: Path, pil_format: str, options: dict) -> None:
+    # write under a temporary name first, so a concurrent upload of the same picture never serves a partial file
+    partial = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    img.save(partial, pil_format, **options)
+    partial.replace(path)
+
+
+def process_profile_image(source: str | Path, max_pixels: int, avif: bool = False) -> tuple[str, int | None]:
+    """Store the picture at every size in PROFILE_IMAGE_SIZES and return its image_file name.
+
+    Files are named after the SHA-256 of the upload, so the same picture uploaded again (by
+    anyone) reuses what is already on disk. The returned name is the full-size JPEG. It comes
+    with the mtime (ns) this call left on it, or None if it reused files that another recent
+    upload may be relying on; an upload that gives up uses it to tell if the files are its own.
+    """
+    avif = avif and features.check("avif")
+    with open(source, "rb") as f:
+        stem = hashlib.file_digest(f, "sha256").hexdigest() + ("-avif" if avif else "")
+    filename = f"{stem}.jpg"
+    path = PROFILE_PICS_DIR / filename
+    # image_file is the last variant written, so once it exists every variant does. Reusing
+    # it refreshes its mtime, which keeps a concurrent release from deleting it, see
+    # profile_image_in_grace
+    with suppress(FileNotFoundError):
+        shared = profile_image_in_grace(filename)
+        os.utime(path)
+        return filename, None if shared else path.stat().st_mtime_ns
+
+    try:
+        original = Image.open(source)
+    except Image.DecompressionBombError as err:
+        raise ImageTooLarge(str(err)) from err
 
-        img = ImageOps.fit(img, (300, 300), method=Image.Resampling.LANCZOS)
+    with original:
+        probe_image(original, max_pixels)
 
-        if img.mode in ("RGBA", "LA", "P"):
+        img = ImageOps.exif_transpose(open_downscaled(original, PROFILE_IMAGE_SIZE))
+
+        img = ImageOps.fit(img, (PROFILE_IMAGE_SIZE, PROFILE_IMAGE_SIZE), method=Image.Resampling.LANCZOS)
+
+        if img.mode != "RGB":
             img = img.convert("RGB")
 
-        filename = f"{uuid.uuid4().hex}.jpg"
-        filepath = PROFILE_PICS_DIR / filename
+    PROFILE_PICS_DIR.mkdir(parents=True, exist_ok=True)
+
+    for mime_type, variants in profile_image_variants(filename).items():
+        extension, pil_format, options = VARIANT_FORMATS[mime_type]
+        for variant, size in variants:
+            resized = img if size == PROFILE_IMAGE_SIZE else img.resize((size, size), Image.Resampling.LANCZOS)
+            _save(resized, PROFILE_PICS_DIR / variant, pil_format, options)
+
+    return filename, path.stat().st_mtime_ns
+
 
-        PROFILE_PICS_DIR.mkdir(parents=True, exist_ok=True)
+def profile_image_mtime(filename: str) -> int | None:
+    try:
+        return (PROFILE_PICS_DIR / filename).stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
 
-        img.save(filepath, "JPEG", quality=85, optimize=True)
 
-    return filename
+def profile_image_in_grace(filename: str) -> bool:
+    """Whether image_file was written or reused within the grace period.
+
+    An upload commits its image_file only after the files are in place, so a file this recent
+    may be about to be referenced even though no user points at it yet.
+    """
+    modified = profile_image_mtime(filename)
+    return modified is not None and time.time_ns() - modified < settings.profile_image_grace_seconds * 1e9
+
+
+def profile_image_files() -> Iterator[str]:
+    """Every image_file name on disk, for sweeping the ones no user references."""
+    if not PROFILE_PICS_DIR.is_dir():
+        return
+    for path in PROFILE_PICS_DIR.iterdir():
+        if VARIANT_NAME.fullmatch(path.name):
+            yield path.name
 
 
 def delete_profile_image(filename: str | None) -> None:
@@ -30,6 +209,12 @@ def delete_profile_image(filename: str | None) -> None:
     if filename is None:
         return
 
+    # image_file goes last, so a half-deleted set is never taken for a complete one
+    for variants in profile_image_variants(filename).values():
+        for variant, _ in variants:
+            if variant != filename:
+                (PROFILE_PICS_DIR / variant).unlink(missing_ok=True)
+
     filepath = PROFILE_PICS_DIR / filename
     if filepath.exists():
-        filepath.unlink()
\ No newline at end of file
+        filepath.unlink()
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from contextlib import suppress
+
+from sqlalchemy import bindparam, update
+
+import models
+from config import settings
+from database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+posts_table = models.Post.__table__
+
+# Adds each post's buffered delta in one executemany; updated_at is left alone because the
+# like count is not part of any cached representation
+flush_statement = (
+    update(posts_table)
+    .where(posts_table.c.id == bindparam("b_post_id"))
+    .values(likes=posts_table.c.likes + bindparam("b_delta"), updated_at=posts_table.c.updated_at)
+)
+
+
+class LikeBuffer:
+    """Coalesces like/unlike deltas in memory and writes them to posts.likes in batches.
+
+    A popular post then costs one UPDATE per flush interval instead of one per like, so
+    likes never queue up behind the row lock. The post_likes rows stay the source of truth;
+    at worst a crash loses the last interval of count changes, not who liked what.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: dict[int, int] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, post_id: int, delta: int) -> None:
+        self._pending[post_id] = self._pending.get(post_id, 0) + delta
+
+    def pending(self, post_id: int) -> int:
+        return self._pending.get(post_id, 0)
+
+    async def flush(self) -> int:
+        pending, self._pending = self._pending, {}
+        rows = [{"b_post_id": post_id, "b_delta": delta} for post_id, delta in pending.items() if delta]
+        if not rows:
+            return 0
+        try:
+            async with AsyncSessionLocal() as db:
+                await db.execute(flush_statement, rows)
+                await db.commit()
+        except Exception:
+            # put the deltas back so the next flush retries them
+            for post_id, delta in pending.items():
+                self.add(post_id, delta)
+            raise
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to flush buffered likes")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        await self.flush()
+
+
+like_buffer = LikeBuffer(settings.likes_flush_interval_seconds)
@@ -2,6 +2,7 @@ from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import HTMLResponse
 from fastapi.exception_handlers import (
     http_exception_handler,
     request_validation_exception_handler,
@@ -9,51 +10,120 @@ from fastapi.exception_handlers import (
 from fastapi.exceptions import RequestValidationError
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import select, func
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from starlette.exceptions import HTTPException as StarletteHTTPException
 
 import models
-from database import engine, get_db
+from auth import password_hash_executor, require_internal_access
+from cache import ALL_POSTS_TAG, page_cache, post_page_tags, user_posts_tag, user_tag
+from database import PRIMARY_PIN_COOKIE, engine, get_db, get_read_db, pool_snapshot, replica_engines
+from email_utils import smtp_pool
+from images_utils import PROFILE_PICS_DIR, image_executor
+from likes import like_buffer
+from metrics import install_metrics, mark_worker_dead, metrics_response
+from middleware import BodySizeLimitMiddleware, ReadYourWritesMiddleware
+from outbox import outbox_worker
+from pagination import fetch_post_page
+from query_stats import QueryStatsMiddleware, configure_request_log, instrument_engine
 from routers import posts, users
+from static_assets import BUILD_DIR, STATIC_DIR, PrecompressedStaticFiles, build_static_assets, static_import_map, static_url
 from config import settings
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
+    build_static_assets()
+    password_hash_executor.start()
+    image_executor.start()
+    like_buffer.start()
+    smtp_pool.start()
+    outbox_worker.start()
     yield
     # Shutdown
+    await like_buffer.stop()
+    await outbox_worker.stop()
+    await smtp_pool.close()
+    image_executor.shutdown()
+    password_hash_executor.shutdown()
     await engine.dispose()
+    for replica in replica_engines:
+        await replica.dispose()
+    mark_worker_dead()
 
 
 app = FastAPI(lifespan=lifespan)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Multipart framing around the file itself is small; this leaves room for it without letting
+# an oversized picture upload reach the form parser
+UPLOAD_BODY_OVERHEAD_BYTES = 64 * 1024
+
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    max_body_size=settings.max_upload_size_bytes + UPLOAD_BODY_OVERHEAD_BYTES,
+    path_pattern=r"/api/users/\d+/picture",
+    detail=f"File too large. Maximum size is {settings.max_upload_size_bytes // (1024 * 1024)}MB",
+)
+
+if replica_engines:
+    app.add_middleware(
+        ReadYourWritesMiddleware,
+        cookie_name=PRIMARY_PIN_COOKIE,
+        window_seconds=settings.database_read_your_writes_seconds,
+    )
+
+for instrumented in (engine, *replica_engines):
+    instrument_engine(instrumented, settings.query_repeat_threshold, settings.query_repeat_mode)
+
+install_metrics(app)
+
+# added last so it wraps everything else, and its timings cover the whole request
+app.add_middleware(QueryStatsMiddleware, header=settings.query_stats_header)
+configure_request_log(settings.query_stats_log_level)
+
+app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR, build_directory=BUILD_DIR), name="static")
+# uploads are written at runtime and not tracked, so a fresh checkout has no media directory yet
+PROFILE_PICS_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/media", StaticFiles(directory="media"), name="media")
 
 templates = Jinja2Templates(directory="templates")
+templates.env.globals.update(static_url=static_url, static_import_map=static_import_map)
 
 app.include_router(users.router, prefix="/api/users", tags=["users"])
 app.include_router(posts.router, prefix="/api/posts", tags=["posts"])
 
 
+def page_cache_key(request: Request, page: str, *params) -> tuple | None:
+    # a client pinned to the primary must see its own writes, which a page rendered from a
+    # lagging replica may not show, so its requests neither read nor fill the cache
+    if PRIMARY_PIN_COOKIE in request.cookies:
+        return None
+    # url_for renders absolute URLs, so pages served under different hosts are cached apart
+    return (page, str(request.base_url), *params)
+
+
+def cached_page(key: tuple | None) -> HTMLResponse | None:
+    body = page_cache.get(key) if key is not None else None
+    if body is None:
+        return None
+    return HTMLResponse(body)
+
+
+def store_page(key: tuple | None, body: bytes, tags: set[str]) -> None:
+    if key is not None:
+        page_cache.set(key, body, tags=tags)
+
+
 @app.get("/", include_in_schema=False, name="home")
 @app.get("/posts", include_in_schema=False, name="posts")
-async def home(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
-    count_result = await db.execute(select(func.count()).select_from(models.Post))
-    total = count_result.scalar() or 0
-
-    result = await db.execute(
-        select(models.Post)
-        .options(selectinload(models.Post.author))
-        .order_by(models.Post.date_posted.desc())
-        .limit(settings.posts_per_page),
-    )
-    posts = result.scalars().all()
+async def home(request: Request, db: Annotated[AsyncSession, Depends(get_read_db)]):
+    key = page_cache_key(request, "home")
+    if (cached := cached_page(key)) is not None:
+        return cached
 
-    has_more = len(posts) < total
+    posts, has_more, next_cursor = await fetch_post_page(db, limit=settings.posts_per_page)
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         request,
         "home.html",
         {
@@ -61,16 +131,23 @@ async def home(request: Request, db: Annotated[AsyncSession, Depends(get_db)]):
             "title": "Home",
             "limit": settings.posts_per_page,
             "has_more": has_more,
+            "next_cursor": next_cursor,
         },
     )
+    store_page(key, response.body, {ALL_POSTS_TAG, *post_page_tags(posts)})
+    return response
 
 
 @app.get("/posts/{post_id}", include_in_schema=False)
 async def post_page(
     request: Request,
     post_id: int,
-    db: Annotated[AsyncSession, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_read_db)],
 ):
+    key = page_cache_key(request, "post", post_id)
+    if (cached := cached_page(key)) is not None:
+        return cached
+
     result = await db.execute(
         select(models.Post)
         .options(selectinload(models.Post.author))
@@ -79,11 +156,13 @@ async def post_page(
     post = result.scalars().first()
     if post:
         title = post.title[:50]
-        return templates.TemplateResponse(
+        response = templates.TemplateResponse(
             request,
             "post.html",
             {"post": post, "title": title},
         )
+        store_page(key, response.body, post_page_tags([post]))
+        return response
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
 
@@ -91,8 +170,11 @@ async def post_page(
 async def user_posts_page(
     request: Request,
     user_id: int,
-    db: Annotated[AsyncSession, Depends(get_db)],
+    db: Annotated[AsyncSession, Depends(get_read_db)],
 ):
+    key = page_cache_key(request, "user_posts", user_id)
+    if (cached := cached_page(key)) is not None:
+        return cached
 
     result = await db.execute(select(models.User).where(models.User.id == user_id))
     user = result.scalars().first()
@@ -102,21 +184,9 @@ async def user_posts_page(
             detail="User not found",
         )
 
-    count_result = await db.execute(select(func.count()).select_from(models.Post).where(models.Post.user_id == user_id))
-    total = count_result.scalar() or 0
-
-    result = await db.execute(
-        select(models.Post)
-        .options(selectinload(models.Post.author))
-        .where(models.Post.user_id == user_id)
-        .order_by(models.Post.date_posted.desc())
-        .limit(settings.posts_per_page),
-    )
-    posts = result.scalars().all()
-
-    has_more = len(posts) < total
+    posts, has_more, next_cursor = await fetch_post_page(db, limit=settings.posts_per_page, user_id=user_id)
 
-    return templates.TemplateResponse(
+    response = templates.TemplateResponse(
         request,
         "user_posts.html",
         {
@@ -125,8 +195,11 @@ async def user_posts_page(
             "title": f"{user.username}'s Posts",
             "limit": settings.posts_per_page,
             "has_more": has_more,
+            "next_cursor": next_cursor,
         },
     )
+    store_page(key, response.body, {user_tag(user_id), user_posts_tag(user_id), *post_page_tags(posts)})
+    return response
 
 
 @app.get("/login", include_in_schema=False)
@@ -176,6 +249,23 @@ async def reset_password_page(request: Request):
     return response
 
 
+@app.get("/internal/stats", include_in_schema=False, dependencies=[Depends(require_internal_access)])
+async def internal_stats(db: Annotated[AsyncSession, Depends(get_db)]):
+    return {
+        "database_pool": pool_snapshot(engine),
+        "database_replicas": [pool_snapshot(replica) for replica in replica_engines],
+        "password_hash": password_hash_executor.snapshot(),
+        "image": image_executor.snapshot(),
+        "smtp": smtp_pool.snapshot(),
+        "email_outbox": {**outbox_worker.stats, **await outbox_worker.backlog(db)},
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return metrics_response()
+
+
 @app.exception_handler(StarletteHTTPException)
 async def general_http_exception_handler(
     request: Request,
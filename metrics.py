@@ -0,0 +1,215 @@
+"""Prometheus metrics, served at /metrics when the optional prometheus_client package is installed.
+
+With several uvicorn workers, point PROMETHEUS_MULTIPROC_DIR at an empty directory (cleared
+before each server start) in every worker's environment: each process then records into its
+own memory-mapped file and /metrics, whichever worker answers it, aggregates all of them.
+"""
+import os
+import time
+
+from fastapi import FastAPI, HTTPException, status
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from auth import password_hash_executor
+from database import TimedQueuePool, engine, replica_engines
+from email_utils import smtp_pool
+from images_utils import image_executor
+from outbox import outbox_worker
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # optional: without it nothing is recorded and /metrics answers 404
+    prometheus_client = None
+
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+if prometheus_client is not None:
+    REQUESTS = Counter("http_requests_total", "HTTP requests handled", ["method", "route", "status"])
+    REQUESTS_IN_PROGRESS = Gauge(
+        "http_requests_in_progress", "HTTP requests being handled", ["method"], multiprocess_mode="livesum"
+    )
+    REQUEST_SECONDS = Histogram(
+        "http_request_duration_seconds",
+        "Time to handle an HTTP request, up to the end of the response body",
+        ["method", "route"],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    )
+
+    DB_POOL_CAPACITY = Gauge(
+        "db_pool_capacity_connections", "Pool size plus max overflow", ["pool"], multiprocess_mode="livesum"
+    )
+    DB_POOL_CHECKED_OUT = Gauge(
+        "db_pool_checked_out_connections", "Connections in use", ["pool"], multiprocess_mode="livesum"
+    )
+    DB_POOL_WAIT_SECONDS = Histogram(
+        "db_pool_wait_seconds",
+        "Time to check a connection out of the pool",
+        ["pool"],
+        buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+    )
+    DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that gave up waiting", ["pool"])
+
+    EXECUTOR_TASKS = Counter("executor_tasks_total", "Worker pool tasks by outcome", ["executor", "outcome"])
+    EXECUTOR_WAIT_SECONDS = Histogram(
+        "executor_wait_seconds",
+        "Time a task queued for a worker",
+        ["executor"],
+        buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10),
+    )
+    EXECUTOR_RUN_SECONDS = Histogram(
+        "executor_run_seconds",
+        "Time a task ran on a worker",
+        ["executor"],
+        buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    )
+
+    EMAIL_SENDS = Counter("email_sends_total", "SMTP sends by outcome", ["outcome"])
+    EMAIL_SEND_SECONDS = Histogram(
+        "email_send_seconds", "Time to hand a message to the SMTP server", buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+    )
+    EMAIL_OUTBOX = Counter("email_outbox_messages_total", "Outbox delivery attempts by outcome", ["outcome"])
+    EMAIL_OUTBOX_DELIVERY_SECONDS = Histogram(
+        "email_outbox_delivery_seconds",
+        "Time from queueing a message to sending it",
+        buckets=(1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 24 * 3600),
+    )
+
+
+def route_template(scope: Scope) -> str:
+    """The matched route's path template, e.g. "/api/posts/{post_id}" for /api/posts/3."""
+    route = scope.get("route")
+    if route is None:
+        # static mounts have no route of their own; anything else found nothing
+        return f"{scope['root_path']}/{{path}}" if scope.get("root_path") else "unmatched"
+    # a route in an included router knows its path relative to the prefix only; the prefix is
+    # whatever of the request path comes before the part the route matched
+    try:
+        matched = route.url_path_for(route.name, **scope.get("path_params", {}))
+    except Exception:
+        return route.path
+    path = scope["path"]
+    if not path.endswith(matched):
+        return route.path
+    return path[: len(path) - len(matched)] + route.path
+
+
+class MetricsMiddleware:
+    """Count and time every request, labeled by the route template it matched.
+
+    Label children are created once per combination and cached, so the hot path is a dict
+    lookup and an uncontended increment; raw paths never become labels.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._in_progress = {}
+        self._recorders = {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in KNOWN_METHODS else "OTHER"
+        in_progress = self._in_progress.get(method)
+        if in_progress is None:
+            in_progress = self._in_progress[method] = REQUESTS_IN_PROGRESS.labels(method)
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress.inc()
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started_at
+            in_progress.dec()
+            route = route_template(scope)
+            key = (method, route, status_code)
+            recorders = self._recorders.get(key)
+            if recorders is None:
+                recorders = self._recorders[key] = (
+                    REQUESTS.labels(method, route, status_code),
+                    REQUEST_SECONDS.labels(method, route),
+                )
+            recorders[0].inc()
+            recorders[1].observe(elapsed)
+
+
+def instrument_pool(name: str, instrumented: AsyncEngine) -> None:
+    pool = instrumented.pool
+    if not isinstance(pool, TimedQueuePool):
+        return
+    DB_POOL_CAPACITY.labels(name).set(pool.size() + pool._max_overflow)
+    checked_out = DB_POOL_CHECKED_OUT.labels(name)
+    wait_seconds = DB_POOL_WAIT_SECONDS.labels(name)
+    timeouts = DB_POOL_TIMEOUTS.labels(name)
+
+    def observe_checkout(wait: float, timed_out: bool) -> None:
+        wait_seconds.observe(wait)
+        if timed_out:
+            timeouts.inc()
+
+    pool.observers.append(observe_checkout)
+    event.listen(instrumented.sync_engine, "checkout", lambda *args: checked_out.inc())
+    event.listen(instrumented.sync_engine, "checkin", lambda *args: checked_out.dec())
+
+
+def observe_executor(name: str, wait: float, run: float, outcome: str) -> None:
+    EXECUTOR_TASKS.labels(name, outcome).inc()
+    EXECUTOR_WAIT_SECONDS.labels(name).observe(wait)
+    if outcome != "rejected":
+        EXECUTOR_RUN_SECONDS.labels(name).observe(run)
+
+
+def observe_email_send(outcome: str, seconds: float) -> None:
+    EMAIL_SENDS.labels(outcome).inc()
+    EMAIL_SEND_SECONDS.observe(seconds)
+
+
+def observe_outbox(outcome: str, seconds: float) -> None:
+    EMAIL_OUTBOX.labels(outcome).inc()
+    if outcome == "sent":
+        EMAIL_OUTBOX_DELIVERY_SECONDS.observe(seconds)
+
+
+def install_metrics(app: FastAPI) -> None:
+    """Hook the request middleware and every pool's observers up to the metrics."""
+    if prometheus_client is None:
+        return
+    instrument_pool("primary", engine)
+    for i, replica in enumerate(replica_engines):
+        instrument_pool(f"replica{i}", replica)
+    password_hash_executor.observers.append(observe_executor)
+    image_executor.observers.append(observe_executor)
+    smtp_pool.observers.append(observe_email_send)
+    outbox_worker.observers.append(observe_outbox)
+    app.add_middleware(MetricsMiddleware)
+
+
+def metrics_response() -> Response:
+    if prometheus_client is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return Response(prometheus_client.generate_latest(registry), media_type=prometheus_client.CONTENT_TYPE_LATEST)
+
+
+def mark_worker_dead() -> None:
+    # drops this process's live gauges (in-flight requests, pool connections) from the aggregate
+    if prometheus_client is not None and MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
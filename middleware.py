@@ -0,0 +1,84 @@
+import re
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """Cap the request body size of matching routes before the body reaches memory.
+
+    A Content-Length above the limit is refused with 413 before anything is read. Bodies
+    without one (chunked uploads) are counted as they arrive and cut off at the limit;
+    the HTTPException raised from receive() passes through FastAPI's body parsing intact.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int, path_pattern: str, detail: str = "Request body too large"):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_pattern = re.compile(path_pattern)
+        self.detail = detail
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.path_pattern.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    break
+                if content_length > self.max_body_size:
+                    response = JSONResponse(
+                        {"detail": self.detail},
+                        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                        headers={"Connection": "close"},
+                    )
+                    await response(scope, receive, send)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+                        detail=self.detail,
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class ReadYourWritesMiddleware:
+    """Pin a client to the primary database for a while after each successful write.
+
+    Any request with a state-changing method that succeeds gets a short-lived cookie;
+    get_read_db reads from the primary while the client sends it back. The cookie is
+    stateless, so it holds across workers and hosts.
+    """
+
+    SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+    def __init__(self, app: ASGIApp, cookie_name: str, window_seconds: int):
+        self.app = app
+        self.cookie = f"{cookie_name}=1; Max-Age={window_seconds}; Path=/; HttpOnly; SameSite=Lax".encode()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] in self.SAFE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message: Message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", self.cookie)]
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
@@ -2,10 +2,28 @@ from __future__ import annotations
 
 from datetime import UTC, datetime
 
-from sqlalchemy import DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import JSON, DateTime, ForeignKey, Index, Integer, String, Text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from database import Base
+from images_utils import profile_image_variants
+
+
+def profile_image_path(image_file: str | None) -> str:
+    if image_file:
+        return f"/media/profile_pics/{image_file}"
+    return "/static/profile_pics/default.jpg"
+
+
+def profile_image_srcset(image_file: str | None) -> dict[str, str]:
+    """MIME type -> srcset for each format the picture is stored in, best format first."""
+    if not image_file:
+        return {}
+    return {
+        mime_type: ", ".join(f"/media/profile_pics/{variant} {width}w" for variant, width in variants)
+        for mime_type, variants in profile_image_variants(image_file).items()
+    }
+
 
 class User(Base):
     __tablename__ = "users"
@@ -14,15 +32,20 @@ class User(Base):
     username: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
     email: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
     password_hash: Mapped[str] = mapped_column(String(200), nullable=False)
-    image_file : Mapped[str | None] = mapped_column(String(200), nullable=True, default=None)
+    image_file : Mapped[str | None] = mapped_column(String(200), nullable=True, default=None, index=True)
+    post_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    posts_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
     posts: Mapped[list[Post]] = relationship(back_populates="author", cascade="all, delete-orphan")
     reset_tokens: Mapped[list[PasswordResetToken]] = relationship(back_populates="user", cascade="all, delete-orphan")
 
     @property
     def image_path(self) -> str:
-        if self.image_file:
-            return f"/media/profile_pics/{self.image_file}"
-        return "/static/profile_pics/default.jpg"
+        return profile_image_path(self.image_file)
+
+    @property
+    def image_srcset(self) -> dict[str, str]:
+        return profile_image_srcset(self.image_file)
 
 class Post(Base):
     __tablename__ = "posts"
@@ -30,18 +53,63 @@ class Post(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     title: Mapped[str] = mapped_column(String(100), nullable=False)
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     date_posted: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
     likes: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC), onupdate=lambda: datetime.now(UTC))
     author: Mapped[User] = relationship(back_populates="posts")
 
+    # Match the listing ORDER BY so pages are read straight off the index; the second one
+    # also serves plain user_id lookups, which is why user_id has no index of its own
+    __table_args__ = (
+        Index("ix_posts_date_posted_id", date_posted.desc(), id.desc()),
+        Index("ix_posts_user_id_date_posted_id", user_id, date_posted.desc(), id.desc()),
+    )
+
+
+class PostLike(Base):
+    __tablename__ = "post_likes"
+
+    # One row per (post, user) is what makes likes idempotent; the count itself lives on posts.likes
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+
 
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
     token_hash: Mapped[str] = mapped_column(String(64), unique=True, nullable=False)
     expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
-    user: Mapped[User] = relationship(back_populates="reset_tokens")
\ No newline at end of file
+    user: Mapped[User] = relationship(back_populates="reset_tokens")
+
+
+class Counter(Base):
+    __tablename__ = "counters"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    kind: Mapped[str] = mapped_column(String(50), nullable=False)
+    to_email: Mapped[str] = mapped_column(String(120), nullable=False)
+    # template context; cleared once the message is sent or given up on, since it can hold a reset token
+    payload: Mapped[dict | None] = mapped_column(JSON(none_as_null=True), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), default="pending", server_default="pending", nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC), nullable=False)
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=lambda: datetime.now(UTC), nullable=False)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # the worker's claim query: due pending messages, oldest first
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
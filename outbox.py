@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import random
+from collections.abc import Callable
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import settings
+from database import AsyncSessionLocal
+from email_utils import PASSWORD_RESET_TEMPLATE, password_reset_email, smtp_pool, templates
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+# kind -> (template, builder called as builder(template, to_email, **payload))
+EMAIL_KINDS = {
+    "password_reset": (PASSWORD_RESET_TEMPLATE, password_reset_email),
+}
+
+# A claimed message that is neither sent nor rescheduled within this long (the worker died
+# mid-send) becomes due again, so delivery is at least once
+CLAIM_LEASE = timedelta(minutes=5)
+
+outbox_table = models.EmailOutbox.__table__
+
+mark_sent_statement = (
+    update(outbox_table)
+    .where(outbox_table.c.id == bindparam("b_id"))
+    .values(status=SENT, sent_at=bindparam("b_sent_at"), payload=None, last_error=None)
+)
+
+mark_failed_statement = (
+    update(outbox_table)
+    .where(outbox_table.c.id == bindparam("b_id"))
+    .values(
+        status=bindparam("b_status"),
+        next_attempt_at=bindparam("b_next_attempt_at"),
+        last_error=bindparam("b_error"),
+        payload=bindparam("b_payload"),
+    )
+)
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands timestamps back without their UTC offset
+    return value if value.tzinfo else value.replace(tzinfo=UTC)
+
+
+def enqueue_email(db: AsyncSession, kind: str, to_email: str, payload: dict) -> None:
+    """Queue a message inside the caller's transaction; it is sent only if that commits."""
+    db.add(models.EmailOutbox(kind=kind, to_email=to_email, payload=payload))
+
+
+def claim_statement(now: datetime, limit: int):
+    due = (
+        select(models.EmailOutbox.id)
+        .where(models.EmailOutbox.status == PENDING, models.EmailOutbox.next_attempt_at <= now)
+        .order_by(models.EmailOutbox.next_attempt_at)
+        .limit(limit)
+        # on Postgres concurrent workers skip each other's rows; SQLite serializes writers anyway
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(outbox_table)
+        .where(outbox_table.c.id.in_(due.scalar_subquery()))
+        .values(next_attempt_at=now + CLAIM_LEASE, attempts=outbox_table.c.attempts + 1)
+        .returning(
+            outbox_table.c.id,
+            outbox_table.c.kind,
+            outbox_table.c.to_email,
+            outbox_table.c.payload,
+            outbox_table.c.attempts,
+            outbox_table.c.created_at,
+        )
+    )
+
+
+class OutboxWorker:
+    """Delivers email_outbox rows in batches over the SMTP pool, retrying with exponential backoff.
+
+    Rows are claimed and their results recorded in short transactions of their own, so a
+    slow SMTP server never holds database locks, and a restart loses nothing.
+    """
+
+    def __init__(self, *, interval: float, batch_size: int, max_attempts: int, retry_base: float, retry_max: float):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.stats = {
+            "sent": 0,
+            "retried": 0,
+            "failed": 0,
+            "delivery_seconds_total": 0.0,
+            "delivery_seconds_max": 0.0,
+        }
+        # called with (outcome, seconds since the message was queued) for every claimed message,
+        # outcome being "sent", "retried" or "failed"
+        self.observers: list[Callable[[str, float], None]] = []
+
+    def wake(self) -> None:
+        """Start a drain now instead of at the next poll, e.g. right after a commit that queued mail."""
+        self._wakeup.set()
+
+    def backoff(self, attempts: int) -> timedelta:
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        # jitter keeps a wave of failures from retrying in lockstep
+        return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+    async def drain_once(self) -> int:
+        """Claim, send and record one batch, returning how many messages were claimed."""
+        now = datetime.now(UTC)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(claim_statement(now, self.batch_size))
+            rows = result.all()
+            await db.commit()
+        if not rows:
+            return 0
+
+        # each template is loaded once per batch, however many messages use it
+        loaded = {}
+
+        async def deliver(row) -> None:
+            template_name, build = EMAIL_KINDS[row.kind]
+            if template_name not in loaded:
+                loaded[template_name] = templates.env.get_template(template_name)
+            await smtp_pool.send(build(loaded[template_name], row.to_email, **row.payload))
+
+        # the pool caps how many of these are actually in flight
+        outcomes = await asyncio.gather(*(deliver(row) for row in rows), return_exceptions=True)
+
+        sent_at = datetime.now(UTC)
+        sent, failed = [], []
+        for row, outcome in zip(rows, outcomes):
+            latency = (sent_at - _aware(row.created_at)).total_seconds()
+            if isinstance(outcome, Exception):
+                give_up = row.attempts >= self.max_attempts
+                failed.append({
+                    "b_id": row.id,
+                    "b_status": FAILED if give_up else PENDING,
+                    "b_next_attempt_at": sent_at + self.backoff(row.attempts),
+                    "b_error": f"{type(outcome).__name__}: {outcome}"[:1000],
+                    "b_payload": None if give_up else row.payload,
+                })
+                delivery = "failed" if give_up else "retried"
+                self.stats[delivery] += 1
+                logger.warning("Sending outbox message %s failed (attempt %s): %s", row.id, row.attempts, outcome)
+            else:
+                sent.append({"b_id": row.id, "b_sent_at": sent_at})
+                delivery = "sent"
+                self.stats["sent"] += 1
+                self.stats["delivery_seconds_total"] += latency
+                self.stats["delivery_seconds_max"] = max(self.stats["delivery_seconds_max"], latency)
+            for observer in self.observers:
+                observer(delivery, latency)
+
+        async with AsyncSessionLocal() as db:
+            if sent:
+                await db.execute(mark_sent_statement, sent)
+            if failed:
+                await db.execute(mark_failed_statement, failed)
+            await db.commit()
+        return len(rows)
+
+    async def backlog(self, db: AsyncSession) -> dict:
+        result = await db.execute(
+            select(func.count(), func.min(models.EmailOutbox.created_at)).where(models.EmailOutbox.status == PENDING),
+        )
+        pending, oldest = result.one()
+        age = (datetime.now(UTC) - _aware(oldest)).total_seconds() if oldest else 0.0
+        return {"pending": pending, "oldest_pending_seconds": age}
+
+    async def _run(self) -> None:
+        while True:
+            with suppress(TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            self._wakeup.clear()
+            try:
+                # keep going while full batches come back, so a backlog drains without waiting
+                while await self.drain_once() >= self.batch_size:
+                    pass
+            except Exception:
+                logger.exception("Failed to drain the email outbox")
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+
+outbox_worker = OutboxWorker(
+    interval=settings.outbox_poll_interval_seconds,
+    batch_size=settings.outbox_batch_size,
+    max_attempts=settings.outbox_max_attempts,
+    retry_base=settings.outbox_retry_base_seconds,
+    retry_max=settings.outbox_retry_max_seconds,
+)
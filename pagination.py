@@ -0,0 +1,142 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException, status
+from sqlalchemy import Row, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import models
+
+# Posts are always listed newest first; id breaks ties between posts created in the same instant
+POST_ORDER = (models.Post.date_posted.desc(), models.Post.id.desc())
+
+
+def encode_position(*values) -> str:
+    """Encode a sort position as an opaque, URL-safe cursor."""
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_position(cursor: str) -> list:
+    """Decode a cursor produced by encode_position, raising 400 if it was tampered with."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except ValueError as err:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        ) from err
+    if not isinstance(values, list):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        )
+    return values
+
+
+def encode_cursor(post: models.Post | Row) -> str:
+    """Encode the (date_posted, id) position of a post as an opaque cursor."""
+    return encode_position(post.date_posted.isoformat(), post.id)
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    values = decode_position(cursor)
+    try:
+        date_posted, post_id = values
+        return datetime.fromisoformat(date_posted), int(post_id)
+    except (ValueError, TypeError) as err:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor",
+        ) from err
+
+
+def after_cursor(cursor: str):
+    """WHERE clause selecting the posts that come after the cursor in POST_ORDER."""
+    date_posted, post_id = decode_cursor(cursor)
+    # A row-value comparison, unlike the equivalent OR, lets both SQLite and Postgres seek the index
+    return tuple_(models.Post.date_posted, models.Post.id) < (date_posted, post_id)
+
+
+# Everything a JSON listing needs, without hydrating Post and User objects
+POST_ROW_COLUMNS = (
+    models.Post.id,
+    models.Post.title,
+    models.Post.content,
+    models.Post.user_id,
+    models.Post.date_posted,
+    models.User.username,
+    models.User.image_file,
+)
+
+
+def paginate_posts(
+    query,
+    *,
+    limit: int,
+    skip: int = 0,
+    cursor: str | None = None,
+    user_id: int | None = None,
+):
+    """Restrict a SELECT over posts to one page, newest first.
+
+    With a cursor the page is located by an index seek on (date_posted, id), so its cost
+    does not grow with depth; skip is only honoured when no cursor is given. One extra
+    row is requested so callers can tell whether another page exists without counting.
+    """
+    query = query.order_by(*POST_ORDER)
+    if user_id is not None:
+        query = query.where(models.Post.user_id == user_id)
+    if cursor:
+        query = query.where(after_cursor(cursor))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit + 1)
+
+
+def post_page_query(*, limit: int, skip: int = 0, cursor: str | None = None, user_id: int | None = None):
+    """Build the SELECT for one page of posts with their authors loaded."""
+    query = select(models.Post).options(selectinload(models.Post.author))
+    return paginate_posts(query, limit=limit, skip=skip, cursor=cursor, user_id=user_id)
+
+
+def post_rows_query(*, limit: int, skip: int = 0, cursor: str | None = None, user_id: int | None = None):
+    """Build the SELECT for one page of posts as plain POST_ROW_COLUMNS rows."""
+    query = select(*POST_ROW_COLUMNS).join(models.User, models.Post.user_id == models.User.id)
+    return paginate_posts(query, limit=limit, skip=skip, cursor=cursor, user_id=user_id)
+
+
+def _split_page(items: list, limit: int) -> tuple[list, bool, str | None]:
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = encode_cursor(items[-1]) if has_more and items else None
+    return items, has_more, next_cursor
+
+
+async def fetch_post_page(
+    db: AsyncSession,
+    *,
+    limit: int,
+    skip: int = 0,
+    cursor: str | None = None,
+    user_id: int | None = None,
+) -> tuple[list[models.Post], bool, str | None]:
+    """Fetch one page of posts, returning them, whether more exist and the next cursor."""
+    result = await db.execute(post_page_query(limit=limit, skip=skip, cursor=cursor, user_id=user_id))
+    return _split_page(list(result.scalars().all()), limit)
+
+
+async def fetch_post_rows(
+    db: AsyncSession,
+    *,
+    limit: int,
+    skip: int = 0,
+    cursor: str | None = None,
+    user_id: int | None = None,
+) -> tuple[list[Row], bool, str | None]:
+    """Like fetch_post_page, but with column rows for the JSON listings."""
+    result = await db.execute(post_rows_query(limit=limit, skip=skip, cursor=cursor, user_id=user_id))
+    return _split_page(list(result.all()), limit)
@@ -0,0 +1,141 @@
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+
+class RepeatedQueryError(Exception):
+    """One request ran the same statement more times than query_repeat_threshold allows."""
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: str = ""
+    # statement text -> executions; bound values are parameters, so a query in a loop repeats exactly
+    shapes: Counter = field(default_factory=Counter)
+    reported: set = field(default_factory=set)
+
+
+# The stats of the request being handled; None outside a request (startup, background workers)
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+
+def instrument_engine(engine: AsyncEngine, repeat_threshold: int = 0, repeat_mode: str = "off") -> None:
+    """Count every statement the engine runs against the current request's QueryStats.
+
+    With repeat_mode "log" or "raise", a statement run more than repeat_threshold times in
+    one request, the usual sign of an N+1 lazy load, is logged once or raises RepeatedQueryError.
+    """
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        context._query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+        stats = current_query_stats.get()
+        if stats is None:
+            return
+        elapsed = time.perf_counter() - context._query_started_at
+        stats.count += 1
+        stats.total_seconds += elapsed
+        if elapsed > stats.slowest_seconds:
+            stats.slowest_seconds = elapsed
+            stats.slowest_statement = statement
+
+        if repeat_mode == "off" or executemany:
+            return
+        stats.shapes[statement] += 1
+        if stats.shapes[statement] > repeat_threshold and statement not in stats.reported:
+            stats.reported.add(statement)
+            message = f"Statement ran {stats.shapes[statement]} times in one request: {statement}"
+            if repeat_mode == "raise":
+                raise RepeatedQueryError(message)
+            logger.warning(message)
+
+
+def configure_request_log(level: str = "INFO") -> None:
+    """Make sure the per-request lines are emitted.
+
+    The app sets up no logging and uvicorn's defaults leave the root logger at WARNING, so the
+    INFO lines would be dropped. A level set on this logger by --log-config is kept, and a
+    handler is only added when neither this logger nor the root has one.
+    """
+    if logger.level == logging.NOTSET:
+        logger.setLevel(level)
+    if not logger.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+
+
+def server_timing(stats: QueryStats) -> str:
+    return (
+        f'db;dur={stats.total_seconds * 1000:.1f};desc="{stats.count} queries", '
+        f"db-slowest;dur={stats.slowest_seconds * 1000:.1f}"
+    )
+
+
+class QueryStatsMiddleware:
+    """Collect per-request database statistics and report them.
+
+    The numbers known when the response starts go out in a Server-Timing header; the final
+    ones, including anything a streaming body queried, go to one log line per request.
+    """
+
+    def __init__(self, app: ASGIApp, header: bool = True):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        started_at = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.header:
+                    message["headers"] = [*message.get("headers", []), (b"server-timing", server_timing(stats).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            logger.info(
+                "%s %s %s queries=%d db_ms=%.1f slowest_ms=%.1f total_ms=%.1f",
+                scope["method"],
+                scope["path"],
+                status_code,
+                stats.count,
+                stats.total_seconds * 1000,
+                stats.slowest_seconds * 1000,
+                (time.perf_counter() - started_at) * 1000,
+                extra={
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status_code,
+                    "queries": stats.count,
+                    "db_ms": round(stats.total_seconds * 1000, 3),
+                    "slowest_ms": round(stats.slowest_seconds * 1000, 3),
+                    "slowest_statement": stats.slowest_statement,
+                },
+            )
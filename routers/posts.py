@@ -1,15 +1,31 @@
-from typing import Annotated
-
-from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
-from sqlalchemy import select, func
+import json
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import Annotated, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy import delete as sql_delete
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 import models
-from database import get_db
-from schemas import PostCreate, PostResponse, PostUpdate, PaginatedPostResponse
-
-from auth import CurrentUser
+from bulk_import import import_posts
+from cache import invalidate_post_pages
+from config import settings
+from counters import POSTS_COUNTER, POSTS_VERSION_COUNTER, get_counters, record_post_change
+from database import get_db, get_read_db
+from exporter import ExportResponse, export_posts
+from http_cache import cache_headers, is_not_modified, make_etag, not_modified
+from likes import like_buffer
+from pagination import fetch_post_rows
+from schemas import PostCreate, PostLikeResponse, PostResponse, PostSearchResponse, PostUpdate, PaginatedPostResponse
+from search import index_post, remove_post, search_posts
+from serialization import ValidatedJSONResponse, post_page_adapter, post_rows_payload
+
+from auth import VerifiedUser, require_internal_access
 
 router = APIRouter()
 
@@ -17,38 +33,74 @@ router = APIRouter()
 
 # get all posts
 @router.get("", response_model=PaginatedPostResponse)
-async def get_Allpost_api(db: Annotated[AsyncSession, Depends(get_db)], skip: Annotated[int, Query(ge=0)] = 0, limit: Annotated[int, Query(ge=1, le=100)] = 10):
+async def get_Allpost_api(request: Request, db: Annotated[AsyncSession, Depends(get_read_db)], skip: Annotated[int, Query(ge=0)] = 0, limit: Annotated[int, Query(ge=1, le=100)] = 10, cursor: Annotated[str | None, Query()] = None):
+
+    counts = await get_counters(db, POSTS_COUNTER, POSTS_VERSION_COUNTER)
+    total = counts[POSTS_COUNTER]
+
+    # the listing version changes with every post write, so it stands in for the whole collection
+    headers = cache_headers(make_etag("posts", counts[POSTS_VERSION_COUNTER], skip, cursor, limit))
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+
+    # a cursor takes precedence over skip, which stays for backward compatibility
+    posts, has_more, next_cursor = await fetch_post_rows(db, limit=limit, skip=skip, cursor=cursor)
+
+    # validated against PaginatedPostResponse once, straight from the rows
+    return ValidatedJSONResponse(
+        {
+            "posts": post_rows_payload(posts),
+            "total": total,
+            "skip": 0 if cursor else skip,
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+        },
+        post_page_adapter,
+        headers=headers,
+    )
+
 
-    count_result = await db.execute(select(func.count()).select_from(models.Post))
-    total = count_result.scalar() or 0
+# export all posts, optionally by author or date range
+@router.get("/export", response_class=StreamingResponse, dependencies=[Depends(require_internal_access)])
+async def export_posts_api(format: Literal["ndjson", "csv"] = "ndjson", user_id: int | None = None, since: datetime | None = None, until: datetime | None = None):
 
-    result = await db.execute(select(models.Post).options(selectinload(models.Post.author)).order_by(models.Post.date_posted.desc()).offset(skip).limit(limit))
-    posts = result.scalars().all()
+    return ExportResponse(export_posts(format, user_id=user_id, since=since, until=until), format, "posts")
 
-    has_more = skip + len(posts) < total
 
-    return PaginatedPostResponse(
-        posts = [PostResponse.model_validate(post) for post in posts],
-        total=total,
-        skip=skip,
+# search posts
+@router.get("/search", response_model=PostSearchResponse)
+async def search_posts_api(db: Annotated[AsyncSession, Depends(get_read_db)], q: Annotated[str, Query(min_length=1, max_length=200)], limit: Annotated[int, Query(ge=1, le=100)] = 10, cursor: Annotated[str | None, Query()] = None):
+
+    posts, has_more, next_cursor = await search_posts(db, q, limit=limit, cursor=cursor)
+
+    return PostSearchResponse(
+        posts=[PostResponse.model_validate(post) for post in posts],
         limit=limit,
         has_more=has_more,
+        next_cursor=next_cursor,
     )
 
 
 @router.get("/{post_id}", response_model=PostResponse)
-async def get_post_api(post_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
+async def get_post_api(post_id: int, request: Request, response: Response, db: Annotated[AsyncSession, Depends(get_read_db)]):
 
     result = await db.execute(select(models.Post).options(selectinload(models.Post.author)).where(models.Post.id == post_id))
     post = result.scalars().first()
     if post:
+        # the response embeds the author, so their profile version is part of the post's
+        last_modified = max(post.updated_at, post.author.updated_at)
+        headers = cache_headers(make_etag("post", post.id, post.updated_at, post.author.updated_at), last_modified)
+        if is_not_modified(request, headers["ETag"], last_modified):
+            return not_modified(headers)
+        response.headers.update(headers)
         return post
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
 
 
 # update a post (put)
 @router.put("/{post_id}", response_model=PostResponse)
-async def updateFull_post_api(post_id: int, current_user: CurrentUser, post_data: PostUpdate, db: Annotated[AsyncSession, Depends(get_db)]):
+async def updateFull_post_api(post_id: int, current_user: VerifiedUser, post_data: PostUpdate, db: Annotated[AsyncSession, Depends(get_db)]):
 
     result = await db.execute(select(models.Post).options(selectinload(models.Post.author)).where(models.Post.id == post_id))
     post = result.scalars().first()
@@ -62,15 +114,18 @@ async def updateFull_post_api(post_id: int, current_user: CurrentUser, post_data
     post.title = post_data.title
     post.content = post_data.content
 
+    await index_post(db, post.id, post.title, post.content)
+    await record_post_change(db, post.user_id)
     await db.commit()
     await db.refresh(post, attribute_names=["author"])
+    invalidate_post_pages(post.id, post.user_id, listings=False)
 
     return post
 
 
 # update a post (patch)
 @router.patch("/{post_id}", response_model=PostResponse)
-async def updatePartial_post_api(post_id: int, current_user: CurrentUser, post_data: PostUpdate, db: Annotated[AsyncSession, Depends(get_db)]):
+async def updatePartial_post_api(post_id: int, current_user: VerifiedUser, post_data: PostUpdate, db: Annotated[AsyncSession, Depends(get_db)]):
 
     result = await db.execute(select(models.Post).options(selectinload(models.Post.author)).where(models.Post.id == post_id))
     post = result.scalars().first()
@@ -86,27 +141,61 @@ async def updatePartial_post_api(post_id: int, current_user: CurrentUser, post_d
     for field, value in update_post_dict.items():
         setattr(post, field, value)
 
+    await index_post(db, post.id, post.title, post.content)
+    await record_post_change(db, post.user_id)
     await db.commit()
     await db.refresh(post, attribute_names=["author"])
+    invalidate_post_pages(post.id, post.user_id, listings=False)
 
     return post
 
 
 # create a post
 @router.post("", response_model=PostResponse, status_code=status.HTTP_201_CREATED)
-async def create_post_api(post: PostCreate, current_user: CurrentUser, db: Annotated[AsyncSession, Depends(get_db)]):
+async def create_post_api(post: PostCreate, current_user: VerifiedUser, db: Annotated[AsyncSession, Depends(get_db)]):
 
     new_post = models.Post(title=post.title, content=post.content, user_id=current_user.id)
     db.add(new_post)
+    await db.flush()
+    await index_post(db, new_post.id, new_post.title, new_post.content)
+    await record_post_change(db, current_user.id, 1)
     await db.commit()
     await db.refresh(new_post, attribute_names=["author"])
+    invalidate_post_pages(None, current_user.id, listings=True)
 
     return new_post
 
 
+# bulk import posts (NDJSON: one {"title": ..., "content": ...} object per line)
+@router.post("/import", response_class=StreamingResponse)
+async def import_posts_api(request: Request, current_user: VerifiedUser, db: Annotated[AsyncSession, Depends(get_db)], batch_size: Annotated[int, Query(ge=1, le=10_000)] = settings.import_batch_size):
+
+    # Rejected lines are collected in a spooled file (memory up to 1MB, disk beyond) and streamed
+    # back once the body is consumed; reading the request and streaming the response at the same
+    # time would compete for the same ASGI receive channel
+    report = SpooledTemporaryFile(max_size=1024 * 1024)
+    summary = await import_posts(
+        db,
+        request.stream(),
+        user_id=current_user.id,
+        batch_size=batch_size,
+        max_line_bytes=settings.import_max_line_bytes,
+        report=report,
+    )
+    report.write(json.dumps(summary).encode() + b"\n")
+    report.seek(0)
+
+    def stream_report():
+        with report:
+            while chunk := report.read(64 * 1024):
+                yield chunk
+
+    return StreamingResponse(stream_report(), media_type="application/x-ndjson")
+
+
 # delete a post
 @router.delete("/{post_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_post_api(post_id: int, current_user: CurrentUser, db: Annotated[AsyncSession, Depends(get_db)]):
+async def delete_post_api(post_id: int, current_user: VerifiedUser, db: Annotated[AsyncSession, Depends(get_db)]):
 
     result = await db.execute(select(models.Post).where(models.Post.id == post_id))
     post = result.scalars().first()
@@ -117,7 +206,53 @@ async def delete_post_api(post_id: int, current_user: CurrentUser, db: Annotated
     if post.user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this post")
 
+    await db.execute(sql_delete(models.PostLike).where(models.PostLike.post_id == post.id))
+    await remove_post(db, post.id)
     await db.delete(post)
+    await record_post_change(db, post.user_id, -1)
+    await db.commit()
+    invalidate_post_pages(post.id, post.user_id, listings=True)
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+async def get_post_likes(db: AsyncSession, post_id: int) -> int:
+    result = await db.execute(select(models.Post.likes).where(models.Post.id == post_id))
+    likes = result.scalar()
+    if likes is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    return likes
+
+
+# like a post
+@router.post("/{post_id}/like", response_model=PostLikeResponse)
+async def like_post_api(post_id: int, current_user: VerifiedUser, db: Annotated[AsyncSession, Depends(get_db)]):
+
+    likes = await get_post_likes(db, post_id)
+
+    db.add(models.PostLike(post_id=post_id, user_id=current_user.id))
+    try:
+        await db.commit()
+    except IntegrityError:
+        # already liked: liking is idempotent
+        await db.rollback()
+    else:
+        like_buffer.add(post_id, 1)
+
+    return PostLikeResponse(post_id=post_id, liked=True, likes=max(likes + like_buffer.pending(post_id), 0))
+
+
+# unlike a post
+@router.delete("/{post_id}/like", response_model=PostLikeResponse)
+async def unlike_post_api(post_id: int, current_user: VerifiedUser, db: Annotated[AsyncSession, Depends(get_db)]):
+
+    likes = await get_post_likes(db, post_id)
+
+    result = await db.execute(
+        sql_delete(models.PostLike).where(models.PostLike.post_id == post_id, models.PostLike.user_id == current_user.id),
+    )
     await db.commit()
+    if result.rowcount:
+        like_buffer.add(post_id, -1)
 
-    return Response(status_code=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+    return PostLikeResponse(post_id=post_id, liked=False, likes=max(likes + like_buffer.pending(post_id), 0))
@@ -1,34 +1,51 @@
 from datetime import timedelta, UTC, datetime
-from typing import Annotated
+from functools import partial
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy import func, select
 from sqlalchemy import delete as sql_delete
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 from PIL import UnidentifiedImageError
 
-from starlette.concurrency import run_in_threadpool
-
-from images_utils import delete_profile_image, process_profile_image
+from images_utils import (
+    ImageTooLarge,
+    UploadTooLarge,
+    delete_profile_image,
+    image_executor,
+    process_profile_image,
+    profile_image_in_grace,
+    profile_image_mtime,
+    spool_upload,
+)
 
 import models
+from cache import invalidate_user_pages
+from counters import POSTS_COUNTER, POSTS_VERSION_COUNTER, adjust_counter
 from auth import (
     create_access_token,
-    hash_password,
-    verify_password,
+    hash_password_async,
+    verify_password_async,
     CurrentUser,
+    CurrentUserRecord,
     generate_reset_token,
-    hash_reset_token
+    invalidate_cached_user,
+    hash_reset_token,
+    require_internal_access,
 )
 
-from email_utils import send_password_reset_email
+from outbox import enqueue_email, outbox_worker
 
 from config import settings
-from database import get_db
+from database import AsyncSessionLocal, get_db, get_read_db
+from executors import ExecutorBusy, ExecutorTimeout
+from exporter import ExportResponse, export_users
+from http_cache import cache_headers, is_not_modified, make_etag, not_modified
+from likes import like_buffer
+from pagination import fetch_post_rows
 from schemas import (
-    PostResponse,
     Token,
     UserCreate,
     UserPrivate,
@@ -39,10 +56,35 @@ from schemas import (
     ForgotPasswordRequest,
     ResetPasswordRequest
 )
+from search import remove_user_posts
+from serialization import ValidatedJSONResponse, post_page_adapter, post_rows_payload
 
 router = APIRouter()
 
 
+async def release_profile_image(db: AsyncSession, filename: str | None) -> None:
+    # identical uploads share their files, so they stay until no user points at them. A recent
+    # file may belong to an upload of the same picture that has not committed yet; the sweep
+    # script removes it later if it stays unreferenced
+    if filename is None:
+        return
+    result = await db.execute(select(models.User.id).where(models.User.image_file == filename).limit(1))
+    if result.first() is None and not profile_image_in_grace(filename):
+        delete_profile_image(filename)
+
+
+async def discard_profile_image(stored: tuple[str, int | None]) -> None:
+    # a picture finished after its upload gave up: no user will point at it, so it goes unless
+    # another upload has used the same files meanwhile (the sweep script gets those later)
+    filename, written_at = stored
+    if written_at is None or profile_image_mtime(filename) != written_at:
+        return
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.User.id).where(models.User.image_file == filename).limit(1))
+    if result.first() is None and profile_image_mtime(filename) == written_at:
+        delete_profile_image(filename)
+
+
 # create a user
 @router.post(
     "",
@@ -76,7 +118,7 @@ async def create_user(user: UserCreate, db: Annotated[AsyncSession, Depends(get_
     new_user = models.User(
         username=user.username,
         email=user.email.lower(),
-        password_hash=hash_password(user.password),
+        password_hash=await hash_password_async(user.password),
     )
     db.add(new_user)
     await db.commit()
@@ -100,7 +142,7 @@ async def login_for_access_token(
 
     # Verify user exists and password is correct
     # Don't reveal which one failed (security best practice)
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user or not await verify_password_async(form_data.password, user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -123,17 +165,24 @@ async def get_current_user(current_user: CurrentUser):
 
 # forget password
 @router.post("/forgot-password", status_code=status.HTTP_202_ACCEPTED)
-async def forgot_password(reqeust_data: ForgotPasswordRequest, background_tasks: BackgroundTasks, db: Annotated[AsyncSession, Depends(get_db)]):
+async def forgot_password(reqeust_data: ForgotPasswordRequest, db: Annotated[AsyncSession, Depends(get_db)]):
+
+    accepted = {
+        "message": "If an account exists with this email, you will receive password reset instructions."
+    }
 
     result = await db.execute(select(models.User).where(
-        func.lower(models.User.email == reqeust_data.email.lower())
+        func.lower(models.User.email) == reqeust_data.email.lower()
     ))
     user = result.scalars().first()
 
-    if user:
-        await db.execute(
-            sql_delete(models.PasswordResetToken).where(models.PasswordResetToken.user_id == user.id)
-        )
+    # same answer either way, so the endpoint does not reveal which emails have accounts
+    if not user:
+        return accepted
+
+    await db.execute(
+        sql_delete(models.PasswordResetToken).where(models.PasswordResetToken.user_id == user.id)
+    )
 
     token = generate_reset_token()
     token_hash = hash_reset_token(token)
@@ -148,18 +197,12 @@ async def forgot_password(reqeust_data: ForgotPasswordRequest, background_tasks:
     )
 
     db.add(reset_token)
+    # committed together with the token, and delivered by the outbox worker even if this process restarts
+    enqueue_email(db, "password_reset", user.email, {"username": user.username, "token": token})
     await db.commit()
+    outbox_worker.wake()
 
-    background_tasks.add_task(
-        send_password_reset_email,
-        to_email=user.email,
-        username=user.username,
-        token=token,
-    )
-
-    return {
-        "message": "If an account exists with this email, you will receive password reset instructions."
-    }
+    return accepted
 
 
 # reset password
@@ -196,13 +239,14 @@ async def reset_password(request_data: ResetPasswordRequest, db: Annotated[Async
         )
 
 
-    user.password_hash = hash_password(request_data.new_password)
+    user.password_hash = await hash_password_async(request_data.new_password)
 
     await db.execute(
         sql_delete(models.PasswordResetToken).where(models.PasswordResetToken.user_id == user.id),
     )
 
     await db.commit()
+    invalidate_cached_user(user.id)
     return {
         "message": "Password reset succesfuly. You can now login in with your new password"
     }
@@ -210,38 +254,50 @@ async def reset_password(request_data: ResetPasswordRequest, db: Annotated[Async
 
 # change password
 @router.patch("/me/password", status_code=status.HTTP_200_OK)
-async def change_password(password_data: ChangePasswordRequest, current_user: CurrentUser, db: Annotated[AsyncSession, Depends(get_db)]):
+async def change_password(password_data: ChangePasswordRequest, current_user: CurrentUserRecord, db: Annotated[AsyncSession, Depends(get_db)]):
 
-    if not verify_password(password_data.current_password, current_user.password_hash):
+    if not await verify_password_async(password_data.current_password, current_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect",
         )
 
-    current_user.password_hash = hash_password(password_data.new_password)
+    current_user.password_hash = await hash_password_async(password_data.new_password)
 
     await db.execute(
         sql_delete(models.PasswordResetToken).where(models.PasswordResetToken.user_id == current_user.id)
     )
 
     await db.commit()
+    invalidate_cached_user(current_user.id)
     return {"message":"Password changed successfully"}
 
 
+# export all users (public profile fields only)
+@router.get("/export", response_class=StreamingResponse, dependencies=[Depends(require_internal_access)])
+async def export_users_api(format: Literal["ndjson", "csv"] = "ndjson"):
+
+    return ExportResponse(export_users(format), format, "users")
+
+
 # get specific user
 @router.get("/{user_id}", response_model=UserPublic)
-async def get_user(user_id: int, db: Annotated[AsyncSession, Depends(get_db)]):
+async def get_user(user_id: int, request: Request, response: Response, db: Annotated[AsyncSession, Depends(get_read_db)]):
 
     result = await db.execute(select(models.User).where(models.User.id == user_id))
     user = result.scalars().first()
     if user:
+        headers = cache_headers(make_etag("user", user.id, user.updated_at), user.updated_at)
+        if is_not_modified(request, headers["ETag"], user.updated_at):
+            return not_modified(headers)
+        response.headers.update(headers)
         return user
     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
 
 # get specific user's posts
 @router.get("/{user_id}/posts", response_model=PaginatedPostResponse)
-async def get_user_posts(user_id: int, db: Annotated[AsyncSession, Depends(get_db)], skip: Annotated[int, Query(ge=0)] = 0, limit: Annotated[int, Query(ge=1, le=100)] = 10):
+async def get_user_posts(user_id: int, request: Request, db: Annotated[AsyncSession, Depends(get_read_db)], skip: Annotated[int, Query(ge=0)] = 0, limit: Annotated[int, Query(ge=1, le=100)] = 10, cursor: Annotated[str | None, Query()] = None):
 
     result = await db.execute(select(models.User).where(models.User.id == user_id))
     user = result.scalars().first()
@@ -251,27 +307,26 @@ async def get_user_posts(user_id: int, db: Annotated[AsyncSession, Depends(get_d
             detail="User not found",
         )
 
-    count_result = await db.execute(select(func.count()).select_from(models.Post).where(models.User.id == user_id))
-    total = count_result.scalar() or 0
-
-    result = await db.execute(
-        select(models.Post)
-        .options(selectinload(models.Post.author))
-        .where(models.Post.user_id == user_id)
-        .order_by(models.Post.date_posted.desc())
-        .offset(skip)
-        .limit(limit),
-    )
-    posts = result.scalars().all()
-
-    has_more =  skip + len(posts) < total
-
-    return PaginatedPostResponse(
-        posts = [PostResponse.model_validate(post) for post in posts],
-        total=total,
-        skip=skip,
-        limit=limit,
-        has_more=has_more,
+    total = user.post_count
+
+    # posts_version moves with every write to the user's posts, updated_at with their profile
+    headers = cache_headers(make_etag("user_posts", user.id, user.posts_version, user.updated_at, skip, cursor, limit))
+    if is_not_modified(request, headers["ETag"]):
+        return not_modified(headers)
+
+    posts, has_more, next_cursor = await fetch_post_rows(db, limit=limit, skip=skip, cursor=cursor, user_id=user_id)
+
+    return ValidatedJSONResponse(
+        {
+            "posts": post_rows_payload(posts),
+            "total": total,
+            "skip": 0 if cursor else skip,
+            "limit": limit,
+            "has_more": has_more,
+            "next_cursor": next_cursor,
+        },
+        post_page_adapter,
+        headers=headers,
     )
 
 
@@ -330,8 +385,12 @@ async def update_user(
     if user_update.email is not None:
         user.email = user_update.email.lower()
 
+    # post listings embed the author's profile
+    await adjust_counter(db, POSTS_VERSION_COUNTER, 1)
     await db.commit()
     await db.refresh(user)
+    invalidate_cached_user(user.id)
+    invalidate_user_pages(user.id)
     return user
 
 
@@ -352,52 +411,98 @@ async def delete_user(user_id: int, current_user: CurrentUser, db: Annotated[Asy
 
     old_filename = user.image_file
 
+    # take back the user's likes on other posts, and drop every like on the user's own posts
+    result = await db.execute(select(models.PostLike.post_id).where(models.PostLike.user_id == user_id))
+    liked_post_ids = result.scalars().all()
+    await db.execute(sql_delete(models.PostLike).where(models.PostLike.user_id == user_id))
+    await db.execute(
+        sql_delete(models.PostLike).where(
+            models.PostLike.post_id.in_(select(models.Post.id).where(models.Post.user_id == user_id)),
+        ),
+    )
+
+    await remove_user_posts(db, user_id)
+
+    # the user's posts go with them through the cascade, so take them off the global count too
+    await adjust_counter(db, POSTS_COUNTER, -user.post_count)
+    await adjust_counter(db, POSTS_VERSION_COUNTER, 1)
     await db.delete(user)
     await db.commit()
+    for post_id in liked_post_ids:
+        like_buffer.add(post_id, -1)
+    invalidate_cached_user(user_id)
+    # pages showing any of their posts carry the user's tag, so this covers the cascade too
+    invalidate_user_pages(user_id)
 
-    if old_filename:
-        delete_profile_image(old_filename)
+    await release_profile_image(db, old_filename)
 
 
 # upload profile picture
 @router.post("/{user_id}/picture", response_model=UserPrivate)
-async def upload_user_profile_picture(user_id: int, current_user: CurrentUser, file: UploadFile, db: Annotated[AsyncSession, Depends(get_db)]):
+async def upload_user_profile_picture(user_id: int, current_user: CurrentUserRecord, file: UploadFile, db: Annotated[AsyncSession, Depends(get_db)]):
 
     if current_user.id != user_id:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to update this user's picture")
 
-    content = await file.read()
-
-    if len(content) > settings.max_upload_size_bytes:
+    try:
+        upload_path = await spool_upload(file, settings.max_upload_size_bytes)
+    except UploadTooLarge as err:
+        # the same status BodySizeLimitMiddleware answers when it catches the upload first
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"File too large. Maximum size is {settings.max_upload_size_bytes// (1024 * 1024)}MB")
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"File too large. Maximum size is {settings.max_upload_size_bytes// (1024 * 1024)}MB") from err
 
     try:
-        new_file = await run_in_threadpool(process_profile_image, content)
+        new_file, _ = await image_executor.run(
+            process_profile_image,
+            upload_path,
+            settings.max_image_pixels,
+            settings.profile_image_avif,
+            # a worker keeps going after a timeout, so the upload is deleted when it is done with it
+            cleanup=partial(upload_path.unlink, missing_ok=True),
+            on_discard=discard_profile_image,
+        )
+    except ExecutorBusy as err:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy. Please try again shortly.",
+            headers={"Retry-After": "1"},
+            ) from err
+    except ExecutorTimeout as err:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Image processing took too long. Please try a smaller image.",
+            ) from err
     except UnidentifiedImageError as err:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid image file. Please upload a valid image (JPEG, PNG, GIF, WebP).",
             ) from err
+    except ImageTooLarge as err:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Image dimensions too large. Maximum is {settings.max_image_pixels // 1_000_000} megapixels",
+            ) from err
 
     old_filename = current_user.image_file
 
     current_user.image_file = new_file
+    await adjust_counter(db, POSTS_VERSION_COUNTER, 1)
     await db.commit()
     await db.refresh(current_user)
+    invalidate_cached_user(current_user.id)
+    invalidate_user_pages(current_user.id)
 
-    if old_filename:
-        delete_profile_image(old_filename)
+    await release_profile_image(db, old_filename)
 
     return current_user
 
 
 # delete profile picture
 @router.delete("/{user_id}/picture", response_model=UserPrivate)
-async def delete_user_profile_picture(user_id: int, current_user: CurrentUser, db: Annotated[AsyncSession, Depends(get_db)]):
+async def delete_user_profile_picture(user_id: int, current_user: CurrentUserRecord, db: Annotated[AsyncSession, Depends(get_db)]):
 
     if current_user.id != user_id:
         raise HTTPException(
@@ -412,9 +517,12 @@ async def delete_user_profile_picture(user_id: int, current_user: CurrentUser, d
             detail="No profile picture to delete")
 
     current_user.image_file = None
+    await adjust_counter(db, POSTS_VERSION_COUNTER, 1)
     await db.commit()
     await db.refresh(current_user)
+    invalidate_cached_user(current_user.id)
+    invalidate_user_pages(current_user.id)
 
-    delete_profile_image(old_filename)
+    await release_profile_image(db, old_filename)
 
     return current_user
@@ -18,6 +18,7 @@ class UserPublic(BaseModel):
     username: str
     image_file: str | None
     image_path: str
+    image_srcset: dict[str, str]
 
 
 class UserPrivate(UserPublic):
@@ -57,14 +58,29 @@ class PostResponse(PostBase):
     author: UserPublic
 
 
+class PostLikeResponse(BaseModel):
+    post_id: int
+    liked: bool
+    likes: int
+
+
 class PaginatedPostResponse(BaseModel):
     posts: list[PostResponse]
     total: int
     skip: int
     limit: int
     has_more: bool
+    next_cursor: str | None = None
 
     # skip = where to start, limit = how many to take. Together they let users browse large datasets in small, safe chunks
+    # next_cursor = opaque position of the last post; pass it back as ?cursor= to fetch the next page without an OFFSET scan
+
+
+class PostSearchResponse(BaseModel):
+    posts: list[PostResponse]
+    limit: int
+    has_more: bool
+    next_cursor: str | None = None
 
 
 class ForgotPasswordRequest(BaseModel):
@@ -0,0 +1,23 @@
+"""Write the fingerprinted, precompressed static assets ahead of deployment.
+
+Usage (from the project root):
+
+    python -m scripts.build_static
+
+The app also builds them at startup, skipping anything already built, so running this
+beforehand only moves the compression work out of the first boot.
+"""
+import argparse
+
+from static_assets import BUILD_DIR, STATIC_DIR, brotli, build_static_assets
+
+
+def main() -> None:
+    built = build_static_assets(STATIC_DIR, BUILD_DIR)
+    encodings = "gzip and brotli" if brotli is not None else "gzip (install brotli for .br files)"
+    print(f"Built {len(built)} assets into {BUILD_DIR} with {encodings}")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(description=__doc__.splitlines()[0]).parse_args()
+    main()
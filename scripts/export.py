@@ -0,0 +1,45 @@
+"""Stream posts or users out of the database as NDJSON or CSV.
+
+Usage (from the project root):
+
+    python -m scripts.export posts --format csv --output posts.csv
+    python -m scripts.export posts --user-id 42 --since 2026-01-01 > user42.ndjson
+    python -m scripts.export users --format csv
+
+Rows come off a server-side cursor in fixed-size batches, so memory use does not grow with
+the table and throughput is bounded by the disk or pipe, not by per-page queries.
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from database import engine
+from exporter import export_posts, export_users
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.kind == "posts":
+        chunks = export_posts(args.format, user_id=args.user_id, since=args.since, until=args.until)
+    else:
+        chunks = export_users(args.format)
+
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        async for chunk in chunks:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("kind", choices=["posts", "users"])
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--output", "-o", help="file to write (defaults to stdout)")
+    parser.add_argument("--user-id", type=int, help="only posts by this author")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="only posts on or after this date")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="only posts before this date")
+    asyncio.run(main(parser.parse_args()))
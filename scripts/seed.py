@@ -0,0 +1,271 @@
+"""Fill a migrated database with synthetic users, posts and password reset tokens, in bulk.
+
+Usage (from the project root):
+
+    python -m scripts.seed --users 200000 --posts 10000000
+    python -m scripts.seed --users 1000 --posts 50000 --reset-tokens 500 --seed 7 --until 2026-01-01
+
+Every account gets the same password (--password), hashed once, so no Argon2 runs per user.
+Post authors follow a Zipf distribution (a few prolific authors, a long tail) and post and
+title lengths a lognormal one, cut from a generated corpus so the search index has real words.
+Rows go in with COPY on Postgres (asyncpg) and large executemany batches elsewhere, one
+transaction per batch; then post counts, the post counters and the search index are updated
+for the new rows.
+
+Rows are appended after the existing ids. From the same database, --seed and --until fix every
+generated value except the password hash, which is salted; pass --password-hash for that too.
+"""
+import argparse
+import asyncio
+import itertools
+import math
+import random
+import sys
+import time
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
+
+from sqlalchemy import Table, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+import models
+from auth import hash_password
+from config import settings
+from counters import POSTS_COUNTER, POSTS_VERSION_COUNTER, adjust_counter
+from database import AsyncSessionLocal, engine
+from search import index_post_range
+
+VOCABULARY = (
+    "the of and to in is it that for on with as was at by be this from are or have not but had "
+    "they you which one were all we when there can an been has more if will would who so no out "
+    "time people year way day man thing woman life child world school state family student group "
+    "country problem hand part place case week company system program question work government "
+    "number night point home water room mother area money story fact month lot right study book "
+    "eye job word business issue side kind head house service friend father power hour game line "
+    "end member law car city community name president team minute idea kid body information back "
+    "parent face others level office door health person art war history party result change "
+    "morning reason research girl guy moment air teacher force education python fastapi database "
+    "query index cache latency server client request response async worker pool replica cursor"
+).split()
+
+# Lognormal (median, sigma) of generated lengths, in characters
+CONTENT_LENGTH = (600, 0.9)
+TITLE_LENGTH = (40, 0.35)
+
+
+def make_corpus(rng: random.Random, words: int = 400_000) -> str:
+    # Zipf-weighted words, so common words are common in the search index too
+    weights = [1 / rank for rank in range(1, len(VOCABULARY) + 1)]
+    return " ".join(rng.choices(VOCABULARY, weights=weights, k=words))
+
+
+def lognormal_length(rng: random.Random, median: int, sigma: float, low: int, high: int) -> int:
+    return min(max(int(rng.lognormvariate(math.log(median), sigma)), low), high)
+
+
+def cut(corpus: str, rng: random.Random, length: int) -> str:
+    start = corpus.find(" ", rng.randrange(len(corpus) - length - 1)) + 1
+    return corpus[start:start + length].strip()
+
+
+def batches(first_id: int, count: int, size: int) -> Iterator[range]:
+    for start in range(first_id, first_id + count, size):
+        yield range(start, min(start + size, first_id + count))
+
+
+async def write_rows(conn: AsyncConnection, table: Table, columns: list[str], rows: list[tuple]) -> None:
+    if conn.dialect.driver == "asyncpg":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(table.name, records=rows, columns=columns)
+    elif conn.dialect.positional:
+        # straight to the driver's executemany: building a dict per row and letting Core
+        # process it is most of the cost of an insert on SQLite
+        compiled = insert(table).compile(dialect=conn.dialect, column_keys=columns)
+        order = [columns.index(name) for name in compiled.positiontup]
+        processors = [table.c[columns[i]].type.dialect_impl(conn.dialect).bind_processor(conn.dialect) for i in order]
+        await conn.exec_driver_sql(
+            compiled.string,
+            [tuple(process(row[i]) if process else row[i] for i, process in zip(order, processors)) for row in rows],
+        )
+    else:
+        await conn.execute(insert(table), [dict(zip(columns, row)) for row in rows])
+    await conn.commit()
+
+
+async def max_id(conn: AsyncConnection, table: Table) -> int:
+    return await conn.scalar(select(func.coalesce(func.max(table.c.id), 0)))
+
+
+def report(name: str, done: int, total: int, started_at: float) -> None:
+    elapsed = time.perf_counter() - started_at
+    print(f"\r{name}: {done}/{total} ({done / max(elapsed, 1e-9):,.0f} rows/s)", end="", file=sys.stderr)
+    if done == total:
+        print(file=sys.stderr)
+
+
+async def seed(
+    *,
+    users: int,
+    posts: int,
+    reset_tokens: int = 0,
+    seed_value: int = 1,
+    until: datetime | None = None,
+    days: int = 365,
+    password: str = "password",
+    password_hash: str | None = None,
+    author_skew: float = 1.1,
+    batch_size: int = 20_000,
+    search_index: bool = True,
+) -> dict[str, range]:
+    """Append the synthetic rows and return the ranges of ids created, by table."""
+    rng = random.Random(seed_value)
+    until = until or datetime.now(UTC)
+    since = until - timedelta(days=days)
+    password_hash = password_hash or hash_password(password)
+    users_table = models.User.__table__
+    posts_table = models.Post.__table__
+    tokens_table = models.PasswordResetToken.__table__
+
+    async with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            # a crash mid-seed leaves a database to throw away anyway
+            await conn.exec_driver_sql("PRAGMA synchronous = OFF")
+        first_user = await max_id(conn, users_table) + 1
+        first_post = await max_id(conn, posts_table) + 1
+        first_token = await max_id(conn, tokens_table) + 1
+        await conn.commit()
+
+        started_at = time.perf_counter()
+        columns = ["id", "username", "email", "password_hash", "post_count", "posts_version", "updated_at"]
+        for ids in batches(first_user, users, batch_size):
+            rows = [(i, f"user{i}", f"user{i}@example.com", password_hash, 0, 0, until) for i in ids]
+            await write_rows(conn, users_table, columns, rows)
+            report("users", ids.stop - first_user, users, started_at)
+
+        user_ids = list(range(1, first_user + users))
+        if posts and user_ids:
+            # popularity rank -> user, shuffled so the prolific authors are not simply the oldest accounts
+            rng.shuffle(user_ids)
+            cum_weights = list(itertools.accumulate(1 / rank ** author_skew for rank in range(1, len(user_ids) + 1)))
+            corpus = make_corpus(rng)
+            step = (until - since) / posts
+            started_at = time.perf_counter()
+            columns = ["id", "title", "content", "user_id", "date_posted", "likes", "updated_at"]
+            for ids in batches(first_post, posts, batch_size):
+                authors = rng.choices(user_ids, cum_weights=cum_weights, k=len(ids))
+                rows = []
+                for i, author in zip(ids, authors):
+                    # ids and dates rise together, as they do for real posts
+                    posted = since + step * (i - first_post)
+                    title = cut(corpus, rng, lognormal_length(rng, *TITLE_LENGTH, 8, 100))
+                    content = cut(corpus, rng, lognormal_length(rng, *CONTENT_LENGTH, 40, 20_000))
+                    rows.append((i, title.capitalize(), content, author, posted, 0, posted))
+                await write_rows(conn, posts_table, columns, rows)
+                report("posts", ids.stop - first_post, posts, started_at)
+
+        if reset_tokens and user_ids:
+            started_at = time.perf_counter()
+            lifetime = timedelta(minutes=settings.reset_token_expire_minutes)
+            span = (until - since).total_seconds()
+            columns = ["id", "user_id", "token_hash", "expires_at", "created_at"]
+            for ids in batches(first_token, reset_tokens, batch_size):
+                rows = []
+                for i in ids:
+                    created = since + timedelta(seconds=rng.random() * span)
+                    rows.append((i, rng.choice(user_ids), f"{rng.getrandbits(256):064x}", created + lifetime, created))
+                await write_rows(conn, tokens_table, columns, rows)
+                report("reset tokens", ids.stop - first_token, reset_tokens, started_at)
+
+        if conn.dialect.name == "postgresql":
+            # the ids were given explicitly, so the sequences have not moved
+            for table in (users_table, posts_table, tokens_table):
+                await conn.execute(
+                    text(f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), (SELECT max(id) FROM {table.name}))")
+                )
+            await conn.commit()
+
+    created = {
+        "users": range(first_user, first_user + users),
+        "posts": range(first_post, first_post + posts),
+        "password_reset_tokens": range(first_token, first_token + reset_tokens),
+    }
+    if posts:
+        await finish_posts(created["posts"], batch_size, search_index)
+    return created
+
+
+async def finish_posts(post_ids: range, batch_size: int, search_index: bool) -> None:
+    """Bring the denormalized post counts, the counters and the search index up to date."""
+    async with AsyncSessionLocal() as db:
+        new_posts = (
+            select(models.Post.user_id, func.count().label("posts"))
+            .where(models.Post.id >= post_ids.start, models.Post.id < post_ids.stop)
+            .group_by(models.Post.user_id)
+            .subquery()
+        )
+        await db.execute(
+            update(models.User)
+            .where(models.User.id == new_posts.c.user_id)
+            .values(
+                post_count=models.User.post_count + new_posts.c.posts,
+                posts_version=models.User.posts_version + 1,
+            )
+        )
+        await adjust_counter(db, POSTS_COUNTER, len(post_ids))
+        await adjust_counter(db, POSTS_VERSION_COUNTER, 1)
+        await db.commit()
+
+        if not search_index:
+            return
+        started_at = time.perf_counter()
+        for ids in batches(post_ids.start, len(post_ids), batch_size):
+            await index_post_range(db, ids.start - 1, ids.stop - 1)
+            await db.commit()
+            report("search index", ids.stop - post_ids.start, len(post_ids), started_at)
+
+
+def parse_date(value: str) -> datetime:
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=UTC)
+
+
+async def main(args: argparse.Namespace) -> None:
+    started_at = time.perf_counter()
+    try:
+        created = await seed(
+            users=args.users,
+            posts=args.posts,
+            reset_tokens=args.reset_tokens,
+            seed_value=args.seed,
+            until=args.until,
+            days=args.days,
+            password=args.password,
+            password_hash=args.password_hash,
+            author_skew=args.author_skew,
+            batch_size=args.batch_size,
+            search_index=not args.no_search_index,
+        )
+    finally:
+        await engine.dispose()
+    rows = sum(len(ids) for ids in created.values())
+    print(f"{rows} rows in {time.perf_counter() - started_at:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--posts", type=int, default=50_000)
+    parser.add_argument("--reset-tokens", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument(
+        "--until",
+        type=parse_date,
+        help="date of the newest post, UTC unless given (defaults to now)",
+    )
+    parser.add_argument("--days", type=int, default=365, help="time span the posts cover")
+    parser.add_argument("--password", default="password", help="password of every generated account")
+    parser.add_argument("--password-hash", help="use this hash instead of hashing --password")
+    parser.add_argument("--author-skew", type=float, default=1.1, help="Zipf exponent of posts per author")
+    parser.add_argument("--batch-size", type=int, default=20_000, help="rows per insert and transaction")
+    parser.add_argument("--no-search-index", action="store_true", help="leave the new posts out of search")
+    asyncio.run(main(parser.parse_args()))
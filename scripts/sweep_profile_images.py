@@ -0,0 +1,58 @@
+"""Delete profile pictures that no user references any more.
+
+Usage (from the project root):
+
+    python -m scripts.sweep_profile_images
+    python -m scripts.sweep_profile_images --dry-run
+
+Replaced pictures are normally deleted right away, but one written or reused within
+PROFILE_IMAGE_GRACE_SECONDS is kept, since an upload of the same picture may not have
+committed yet. Run this periodically (e.g. hourly from cron) to remove those once they
+are past the grace period and still unreferenced.
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select
+
+import models
+from database import AsyncSessionLocal, engine
+from images_utils import delete_profile_image, profile_image_files, profile_image_in_grace
+
+
+async def sweep(dry_run: bool = False) -> list[str]:
+    """Delete every unreferenced picture past the grace period and return their names."""
+    candidates = [filename for filename in profile_image_files() if not profile_image_in_grace(filename)]
+    async with AsyncSessionLocal() as db:
+        referenced = set()
+        # in chunks, to stay under the bound-parameter limit
+        for start in range(0, len(candidates), 500):
+            chunk = candidates[start:start + 500]
+            result = await db.execute(select(models.User.image_file).where(models.User.image_file.in_(chunk)))
+            referenced.update(result.scalars())
+    swept = []
+    for filename in candidates:
+        # checked again right before deleting: an upload may have reused it since
+        if filename in referenced or profile_image_in_grace(filename):
+            continue
+        if not dry_run:
+            delete_profile_image(filename)
+        swept.append(filename)
+    return swept
+
+
+async def main(args: argparse.Namespace) -> None:
+    try:
+        swept = await sweep(args.dry_run)
+    finally:
+        await engine.dispose()
+    for filename in swept:
+        print(filename)
+    print(f"{'would delete' if args.dry_run else 'deleted'} {len(swept)} pictures", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="list the pictures without deleting them")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,146 @@
+import re
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+import models
+from database import engine
+from pagination import decode_position, encode_position
+
+# The inverted index lives outside the ORM models: an FTS5 virtual table (posts_fts, rowid = post id)
+# on SQLite, and a weighted tsvector column (posts.search_vector) with a GIN index on Postgres.
+# Titles weigh more than content in both. See the add_post_search migration.
+# Schema objects the models do not declare, which autogenerate must leave alone
+FTS_TABLES = {"posts_fts", "posts_fts_data", "posts_fts_idx", "posts_fts_content", "posts_fts_docsize", "posts_fts_config"}
+SEARCH_COLUMNS = {("posts", "search_vector")}
+
+TS_CONFIG = "english"
+TSVECTOR_EXPRESSION = (
+    f"setweight(to_tsvector('{TS_CONFIG}', title), 'A') || setweight(to_tsvector('{TS_CONFIG}', content), 'B')"
+)
+
+
+def uses_postgres() -> bool:
+    return engine.dialect.name == "postgresql"
+
+
+def fts5_query(q: str) -> str:
+    """Turn free text into an FTS5 query that matches all words, with no operator syntax."""
+    terms = re.findall(r"\w+", q)
+    return " ".join(f'"{term}"' for term in terms)
+
+
+async def index_post(db: AsyncSession, post_id: int, title: str, content: str) -> None:
+    """Add or refresh a post in the index, inside the caller's transaction."""
+    if uses_postgres():
+        await db.execute(
+            text(f"UPDATE posts SET search_vector = {TSVECTOR_EXPRESSION} WHERE id = :post_id"),
+            {"post_id": post_id},
+        )
+        return
+    await remove_post(db, post_id)
+    await db.execute(
+        text("INSERT INTO posts_fts (rowid, title, content) VALUES (:post_id, :title, :content)"),
+        {"post_id": post_id, "title": title, "content": content},
+    )
+
+
+async def index_posts(db: AsyncSession, posts: list[tuple[int, str, str]]) -> None:
+    """Add many new (id, title, content) posts to the index in one executemany."""
+    if not posts:
+        return
+    if uses_postgres():
+        await db.execute(
+            text(f"UPDATE posts SET search_vector = {TSVECTOR_EXPRESSION} WHERE id = :post_id"),
+            [{"post_id": post_id} for post_id, _, _ in posts],
+        )
+        return
+    await db.execute(
+        text("INSERT INTO posts_fts (rowid, title, content) VALUES (:post_id, :title, :content)"),
+        [{"post_id": post_id, "title": title, "content": content} for post_id, title, content in posts],
+    )
+
+
+async def index_post_range(db: AsyncSession, after_id: int, last_id: int) -> None:
+    """Index the posts with after_id < id <= last_id straight from the posts table, for bulk loads."""
+    if uses_postgres():
+        statement = f"UPDATE posts SET search_vector = {TSVECTOR_EXPRESSION} WHERE id > :after_id AND id <= :last_id"
+    else:
+        statement = (
+            "INSERT INTO posts_fts (rowid, title, content) "
+            "SELECT id, title, content FROM posts WHERE id > :after_id AND id <= :last_id"
+        )
+    await db.execute(text(statement), {"after_id": after_id, "last_id": last_id})
+
+
+async def remove_post(db: AsyncSession, post_id: int) -> None:
+    # on Postgres the vector is deleted along with the row
+    if not uses_postgres():
+        await db.execute(text("DELETE FROM posts_fts WHERE rowid = :post_id"), {"post_id": post_id})
+
+
+async def remove_user_posts(db: AsyncSession, user_id: int) -> None:
+    if not uses_postgres():
+        await db.execute(
+            text("DELETE FROM posts_fts WHERE rowid IN (SELECT id FROM posts WHERE user_id = :user_id)"),
+            {"user_id": user_id},
+        )
+
+
+def _ranked_ids_query(after: bool) -> str:
+    # Both databases produce (post_id, rank) with lower rank = better match, so the keyset
+    # condition and ORDER BY around them are shared
+    if uses_postgres():
+        matches = (
+            f"SELECT id AS post_id, -ts_rank_cd(search_vector, query)::float8 AS rank "
+            f"FROM posts, websearch_to_tsquery('{TS_CONFIG}', :q) AS query WHERE search_vector @@ query"
+        )
+    else:
+        matches = "SELECT rowid AS post_id, bm25(posts_fts, 2.0, 1.0) AS rank FROM posts_fts WHERE posts_fts MATCH :q"
+    where = "WHERE (rank, post_id) > (:after_rank, :after_id) " if after else ""
+    return f"SELECT post_id, rank FROM ({matches}) AS matches {where}ORDER BY rank, post_id LIMIT :limit"
+
+
+async def search_posts(
+    db: AsyncSession,
+    q: str,
+    *,
+    limit: int,
+    cursor: str | None = None,
+) -> tuple[list[models.Post], bool, str | None]:
+    """Return one page of posts matching q, best match first, plus has_more and the next cursor."""
+    query = q if uses_postgres() else fts5_query(q)
+    if not query.strip():
+        return [], False, None
+
+    params = {"q": query, "limit": limit + 1}
+    if cursor:
+        try:
+            after_rank, after_id = decode_position(cursor)
+            params.update(after_rank=float(after_rank), after_id=int(after_id))
+        except (TypeError, ValueError) as err:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor",
+            ) from err
+
+    result = await db.execute(text(_ranked_ids_query(after=bool(cursor))), params)
+    ranked = result.all()
+    has_more = len(ranked) > limit
+    ranked = ranked[:limit]
+    if not ranked:
+        return [], False, None
+
+    result = await db.execute(
+        select(models.Post)
+        .options(selectinload(models.Post.author))
+        .where(models.Post.id.in_([row.post_id for row in ranked])),
+    )
+    by_id = {post.id: post for post in result.scalars().all()}
+    posts = [by_id[row.post_id] for row in ranked if row.post_id in by_id]
+
+    last = ranked[-1]
+    next_cursor = encode_position(last.rank, last.post_id) if has_more else None
+    return posts, has_more, next_cursor
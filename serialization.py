@@ -0,0 +1,61 @@
+from collections.abc import Sequence
+from typing import Any
+
+from fastapi.responses import Response
+from pydantic import TypeAdapter
+from sqlalchemy import Row
+
+import models
+from schemas import PaginatedPostResponse, UserPublic
+
+post_page_adapter = TypeAdapter(PaginatedPostResponse)
+
+
+class RowAuthor:
+    """A post row's author columns, with the image fields User computes from them."""
+
+    __slots__ = ("id", "username", "image_file")
+
+    image_path = models.User.image_path
+    image_srcset = models.User.image_srcset
+
+    def __init__(self, row: Row):
+        self.id = row.user_id
+        self.username = row.username
+        self.image_file = row.image_file
+
+
+class ValidatedJSONResponse(Response):
+    """A JSON response validated against a schema once and serialized straight to bytes.
+
+    Returning it from a handler skips FastAPI's response_model pass, which would validate and
+    serialize the payload a second time. The payload may hold plain rows or ORM objects:
+    fields are read by attribute, so the schema alone decides what goes out.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, adapter: TypeAdapter, **kwargs):
+        self.adapter = adapter
+        super().__init__(content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return self.adapter.dump_json(self.adapter.validate_python(content, from_attributes=True))
+
+
+def post_rows_payload(rows: Sequence[Row]) -> list[dict]:
+    """Pair POST_ROW_COLUMNS rows with their authors, ready for PostResponse validation.
+
+    The rows carry no field list of their own: whatever PostResponse declares is read from them.
+    """
+    authors = {}
+    posts = []
+    fields = rows[0]._fields if rows else ()
+    for row in rows:
+        author = authors.get(row.user_id)
+        if author is None:
+            # a page tends to repeat authors, so each is validated once; the page validation
+            # then takes the finished UserPublic as it is
+            author = authors[row.user_id] = UserPublic.model_validate(RowAuthor(row))
+        posts.append(dict(zip(fields, row), author=author))
+    return posts
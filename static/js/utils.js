@@ -40,4 +40,12 @@ export function formatDate(dateString) {
     month: "long",
     day: "2-digit",
   });
-}
\ No newline at end of file
+}
+
+// Avatar markup matching the server-rendered <picture>: the stored WebP/AVIF variants first, JPEG as fallback
+export function profilePictureHTML(user) {
+  const sources = Object.entries(user.image_srcset || {})
+    .map(([type, srcset]) => `<source type="${escapeHtml(type)}" srcset="${escapeHtml(srcset)}" sizes="72px">`)
+    .join("");
+  return `<picture class="flex-shrink-0">${sources}<img class="rounded-circle article-img" src="${escapeHtml(user.image_path)}" alt="${escapeHtml(user.username)}'s profile picture" width="64" height="64" loading="lazy"></picture>`;
+}
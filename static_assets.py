@@ -0,0 +1,140 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import uuid
+from pathlib import Path
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip siblings are written
+    brotli = None
+
+STATIC_DIR = Path("static")
+BUILD_DIR = Path("build/static")
+STATIC_URL = "/static"
+
+# Uploaded and generated images are already compressed; text formats shrink several times over
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".webmanifest", ".json", ".ico", ".txt"}
+
+# Preferred first when a client accepts several
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+mimetypes.add_type("application/manifest+json", ".webmanifest")
+
+# source path relative to STATIC_DIR -> fingerprinted path relative to BUILD_DIR
+manifest: dict[str, str] = {}
+fingerprinted: set[str] = set()
+
+
+def fingerprint(path: str, content: bytes) -> str:
+    stem, dot, suffix = path.rpartition(".")
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{stem}.{digest}.{suffix}" if dot else f"{path}.{digest}"
+
+
+def _write(path: Path, content: bytes) -> None:
+    # several workers may build at once; a reader only ever sees a complete file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(f".{path.name}.{uuid.uuid4().hex}")
+    partial.write_bytes(content)
+    partial.replace(path)
+
+
+def build_static_assets(source: Path = STATIC_DIR, target: Path = BUILD_DIR) -> dict[str, str]:
+    """Copy every static file to a content-hashed name with gzip and brotli siblings.
+
+    Files already built are left alone, so this is cheap to run on every startup.
+    """
+    built = {}
+    for file in sorted(source.rglob("*")):
+        if not file.is_file() or file.name.startswith("."):
+            continue
+        path = file.relative_to(source).as_posix()
+        content = file.read_bytes()
+        hashed = fingerprint(path, content)
+        built[path] = hashed
+
+        destination = target / hashed
+        if destination.exists():
+            continue
+        if file.suffix in COMPRESSIBLE_SUFFIXES:
+            compressed = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed[".br"] = brotli.compress(content, quality=11)
+            for suffix, data in compressed.items():
+                if len(data) < len(content):
+                    _write(destination.with_name(destination.name + suffix), data)
+        # the plain file goes last: once it exists, the build of this asset is complete
+        _write(destination, content)
+
+    manifest.clear()
+    manifest.update(built)
+    fingerprinted.clear()
+    fingerprinted.update(built.values())
+    return built
+
+
+def static_url(path: str) -> str:
+    """URL of a static file, fingerprinted once the assets are built."""
+    return f"{STATIC_URL}/{manifest.get(path, path)}"
+
+
+def static_import_map() -> dict:
+    # lets `import ... from '/static/js/auth.js'` in any module resolve to the fingerprinted file
+    return {
+        "imports": {
+            f"{STATIC_URL}/{path}": f"{STATIC_URL}/{hashed}"
+            for path, hashed in manifest.items()
+            if path.endswith(".js")
+        }
+    }
+
+
+def accepted_encodings(header: str) -> set[str]:
+    encodings = set()
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        try:
+            quality = float(params.strip().removeprefix("q=")) if params.strip() else 1.0
+        except ValueError:
+            quality = 1.0
+        if quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that also serves the fingerprinted build.
+
+    A fingerprinted path never changes content, so it is cached for a year without
+    revalidation, and answered from a precompressed sibling when the client accepts one.
+    Other paths are served from the source directory as before.
+    """
+
+    def __init__(self, *, directory: str | os.PathLike, build_directory: str | os.PathLike):
+        super().__init__(directory=directory)
+        self.build_directory = Path(build_directory)
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        path = path.replace(os.sep, "/")
+        if path not in fingerprinted or scope["method"] not in ("GET", "HEAD"):
+            return await super().get_response(path, scope)
+
+        file = self.build_directory / path
+        headers = {"Cache-Control": IMMUTABLE, "Vary": "Accept-Encoding"}
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+        for encoding, suffix in ENCODINGS:
+            compressed = file.with_name(file.name + suffix)
+            if encoding in accepted and compressed.is_file():
+                headers["Content-Encoding"] = encoding
+                return FileResponse(compressed, headers=headers, media_type=media_type)
+        return FileResponse(file, headers=headers, media_type=media_type)
@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+import pytest
+
+# settings are read when the app modules are imported, so point them at a scratch database first
+_scratch = tempfile.TemporaryDirectory()
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{_scratch.name}/test.db"
+os.environ.setdefault("SECRET_KEY", "test-secret-key-that-is-long-enough-for-hs256")
+
+from database import Base, engine  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def tables():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    # pooled connections belong to this test's event loop
+    await engine.dispose()
@@ -0,0 +1,137 @@
+import asyncio
+from datetime import UTC, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+import models
+import outbox
+from database import AsyncSessionLocal
+from outbox import FAILED, PENDING, SENT, OutboxWorker, _aware, claim_statement, enqueue_email
+
+pytestmark = [pytest.mark.anyio, pytest.mark.usefixtures("tables")]
+
+PAYLOAD = {"username": "alice", "token": "reset-token"}
+
+
+def make_worker(max_attempts: int = 3) -> OutboxWorker:
+    return OutboxWorker(interval=60, batch_size=10, max_attempts=max_attempts, retry_base=30, retry_max=3600)
+
+
+async def enqueue(count: int = 1) -> None:
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            enqueue_email(db, "password_reset", f"user{i}@example.com", PAYLOAD)
+        await db.commit()
+
+
+async def rows() -> list[models.EmailOutbox]:
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(models.EmailOutbox).order_by(models.EmailOutbox.id))
+        return list(result.scalars())
+
+
+@pytest.fixture
+def sent(monkeypatch) -> list:
+    messages = []
+
+    async def send(message) -> None:
+        messages.append(message)
+
+    monkeypatch.setattr(outbox.smtp_pool, "send", send)
+    return messages
+
+
+@pytest.fixture
+def failing_send(monkeypatch) -> None:
+    async def send(message) -> None:
+        raise ConnectionError("smtp down")
+
+    monkeypatch.setattr(outbox.smtp_pool, "send", send)
+
+
+async def test_enqueued_message_is_pending_until_the_transaction_commits(sent):
+    async with AsyncSessionLocal() as db:
+        enqueue_email(db, "password_reset", "alice@example.com", PAYLOAD)
+        await db.rollback()
+    assert await rows() == []
+
+    await enqueue()
+    [row] = await rows()
+    assert (row.status, row.attempts, row.payload) == (PENDING, 0, PAYLOAD)
+
+
+async def test_claimed_message_is_sent_and_its_payload_cleared(sent):
+    await enqueue()
+    worker = make_worker()
+
+    assert await worker.drain_once() == 1
+
+    [row] = await rows()
+    assert row.status == SENT
+    assert row.attempts == 1
+    assert row.payload is None
+    assert row.sent_at is not None
+    assert [message["To"] for message in sent] == ["user0@example.com"]
+    assert worker.stats["sent"] == 1
+    # nothing is due any more
+    assert await worker.drain_once() == 0
+
+
+async def test_failed_send_is_rescheduled_with_backoff(failing_send):
+    await enqueue()
+    worker = make_worker()
+    before = datetime.now(UTC)
+
+    assert await worker.drain_once() == 1
+
+    [row] = await rows()
+    assert row.status == PENDING
+    assert row.attempts == 1
+    assert row.payload == PAYLOAD
+    assert row.last_error == "ConnectionError: smtp down"
+    # first retry after retry_base seconds, jittered down to no less than half of it
+    delay = _aware(row.next_attempt_at) - before
+    assert timedelta(seconds=15) <= delay <= timedelta(seconds=31)
+    assert worker.stats["retried"] == 1
+    # not due again before the backoff has passed
+    assert await worker.drain_once() == 0
+
+
+async def test_backoff_doubles_and_is_capped():
+    worker = OutboxWorker(interval=60, batch_size=10, max_attempts=10, retry_base=30, retry_max=100)
+    assert timedelta(seconds=30) <= worker.backoff(2) <= timedelta(seconds=60)
+    assert timedelta(seconds=50) <= worker.backoff(8) <= timedelta(seconds=100)
+
+
+async def test_gives_up_after_max_attempts_and_clears_the_payload(failing_send):
+    await enqueue()
+    worker = make_worker(max_attempts=1)
+
+    assert await worker.drain_once() == 1
+
+    [row] = await rows()
+    assert row.status == FAILED
+    assert row.attempts == 1
+    assert row.payload is None
+    assert worker.stats["failed"] == 1
+    assert await worker.drain_once() == 0
+
+
+async def test_concurrent_claimers_never_get_the_same_row():
+    await enqueue(20)
+    now = datetime.now(UTC)
+
+    async def claim() -> set[int]:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(claim_statement(now, 15))
+            claimed = {row.id for row in result}
+            await db.commit()
+            return claimed
+
+    first, second = await asyncio.gather(claim(), claim())
+
+    assert first.isdisjoint(second)
+    assert first | second == {row.id for row in await rows()}
+    # both leases hold: a third claimer finds nothing due
+    assert await claim() == set()